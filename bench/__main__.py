@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+
+from .harness import Benchmark
+from .harness import Workload
+
+"""
+times the plas pipeline phase by phase on the sample programs and on
+generated workloads. run from the repository root:
+
+    python -m bench --output results.json
+    python -m bench --baseline results.json --threshold 0.2
+
+a run compared against a baseline exits with status 1 when a phase of
+a workload got slower than the threshold allows
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="python -m bench", description="plas phase benchmarks")
+    arg_parser.add_argument("--programs", default=os.path.join(ROOT, "tests", "*.plas"), metavar="PATTERN",
+                            help="sample programs to time (default: tests/*.plas)")
+    arg_parser.add_argument("--no-generated", action="store_true", help="leave out the generated workloads")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="generate the large workloads, up to a million lines or iterations")
+    arg_parser.add_argument("--repeat", type=int, default=3, metavar="N", help="runs per workload, the best counts")
+    arg_parser.add_argument("-O", dest="optimize", type=int, default=0, metavar="LEVEL",
+                            help="optimizer level used by the compile phase")
+    arg_parser.add_argument("--jit", action="store_true", help="run with the tracing jit")
+    arg_parser.add_argument("--output", metavar="FILE", help="write the results as json")
+    arg_parser.add_argument("--baseline", metavar="FILE", help="json results of an earlier run to compare with")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="allowed slowdown of a phase over the baseline (default: 0.25)")
+    arg_parser.add_argument("--floor", type=float, default=0.005, metavar="SECONDS",
+                            help="phases faster than this are not compared (default: 0.005)")
+    args = arg_parser.parse_args()
+
+    workloads = Workload.from_files(args.programs)
+    if not args.no_generated:
+        workloads += Workload.generated(args.full)
+    if not workloads:
+        sys.stderr.write("no workloads to run\n")
+        sys.exit(2)
+
+    results = Benchmark(workloads, args.repeat, args.optimize, args.jit).run(
+        lambda name, result: sys.stderr.write("timed %s\n" % name))
+    sys.stdout.write(Benchmark.table(results))
+    if args.output:
+        Benchmark.write(results, args.output)
+
+    if args.baseline:
+        baseline = Benchmark.load(args.baseline)
+        if (baseline.get("optimize"), baseline.get("jit")) != (results["optimize"], results["jit"]):
+            sys.stderr.write("warning: the baseline was run with other optimizer or jit settings\n")
+        regressions = Benchmark.compare(baseline, results, args.threshold, args.floor)
+        for (name, phase, old, new) in regressions:
+            sys.stdout.write("regression: %s %s %.6fs -> %.6fs (%+.0f%%)\n" % (
+                name, phase, old, new, (new / old - 1) * 100))
+        if regressions:
+            sys.exit(1)
+        sys.stdout.write("no regressions over %s\n" % args.baseline)
+
+
+main()
@@ -0,0 +1,96 @@
+"""
+synthetic plas programs that scale with a size parameter, each
+generator returns the program source as a string
+"""
+
+
+def counted_loop(iterations: int) -> str:
+    """ one register counted up to iterations by a three instruction loop """
+    return "\n".join([
+        "# counted loop of %d iterations" % iterations,
+        "load $0 0",
+        "add $0 1 : loop",
+        "eval $0 %d" % iterations,
+        "iflt @loop",
+        "exit 0"
+    ]) + "\n"
+
+
+def call_chain(calls: int) -> str:
+    """ calls go/home round trips made one after another from the top
+    level, each to its own label, so the call stack never gets deeper
+    than one """
+    lines = ["# chain of %d go/home calls" % calls, "load $0 0"]
+    lines += ["go @call_%d" % call for call in range(calls)]
+    lines.append("go @done")
+    for call in range(calls):
+        lines.append("add $0 %d : call_%d" % (call % 7 + 1, call))
+        lines.append("home")
+    lines.append("exit 0 : done")
+    return "\n".join(lines) + "\n"
+
+
+def recursive_calls(calls: int, depth: int = 1000) -> str:
+    """ calls go/home round trips as a recursion depth calls deep, made
+    again until calls are done. depth stays below the call stack size """
+    depth = min(calls, depth)
+    return "\n".join([
+        "# %d go/home calls nested %d deep" % (calls, depth),
+        "load $1 0",
+        "load $0 %d : round" % depth,
+        "go @descend",
+        "add $1 1",
+        "eval $1 %d" % max(1, calls // depth),
+        "iflt @round",
+        "exit 0",
+        "eval $0 0 : descend",
+        "ifeq @bottom",
+        "sub $0 1",
+        "go @descend",
+        "add $2 1",
+        "home : bottom"
+    ]) + "\n"
+
+
+def straight_line(length: int) -> str:
+    """ length arithmetic instructions without a single jump """
+    operations = ("load $%x %d", "add $%x %d", "sub $%x %d", "add $%x $%x")
+    lines = ["# %d straight line instructions" % length]
+    for number in range(length):
+        register = number % 16
+        operation = operations[number % len(operations)]
+        operand = (register + 1) % 16 if operation.endswith("$%x") else number % 100
+        lines.append(operation % (register, operand))
+    lines.append("exit 0")
+    return "\n".join(lines) + "\n"
+
+
+def putc_heavy(characters: int) -> str:
+    """ a loop writing characters letters, a newline every 64 of them """
+    return "\n".join([
+        "# %d characters of output" % characters,
+        "load $1 65",
+        "load $2 10",
+        "load $0 0",
+        "load $3 0",
+        "putc $1 : loop",
+        "add $0 1",
+        "add $3 1",
+        "eval $3 64",
+        "iflt @next",
+        "putc $2",
+        "load $3 0",
+        "eval $0 %d : next" % characters,
+        "iflt @loop",
+        "exit 0"
+    ]) + "\n"
+
+
+# name -> (generator, size of the quick run, size of the full run)
+GENERATORS = {
+    "counted_loop": (counted_loop, 100000, 1000000),
+    "call_chain": (call_chain, 10000, 100000),
+    "recursive_calls": (recursive_calls, 10000, 100000),
+    "straight_line": (straight_line, 100000, 1000000),
+    "putc_heavy": (putc_heavy, 100000, 1000000)
+}
@@ -0,0 +1,159 @@
+import os
+import glob
+import json
+import time
+import platform
+
+from plas import PLAS_VERSION
+from plas import PVM
+from plas import Parser
+from plas import Program
+from plas import PlasError
+from lang.preprocessor import Preprocessor
+from lang.tokenizer import Tokenizer
+from lang.output import OutputChannel
+from lang.output import BytesSink
+from lang.output import FlushPolicy
+
+from .generators import GENERATORS
+
+
+# one program to time, its source is kept in memory so reading the
+# file is not part of any phase
+class Workload:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+
+    @staticmethod
+    def from_files(pattern) -> list:
+        workloads = []
+        for file in sorted(glob.glob(pattern)):
+            with open(file) as f:
+                workloads.append(Workload(os.path.basename(file), f.read()))
+        return workloads
+
+    @staticmethod
+    def generated(full=False) -> list:
+        workloads = []
+        for (name, (generator, quick_size, full_size)) in GENERATORS.items():
+            size = full_size if full else quick_size
+            workloads.append(Workload("%s_%d" % (name, size), generator(size)))
+        return workloads
+
+
+# times every phase of the pipeline on its own. a phase gets the
+# finished output of the one before it, so its time is its own work
+class Benchmark:
+    PHASES = ("preprocess", "tokenize", "parse", "compile", "run")
+
+    def __init__(self, workloads, repeat=3, optimize=0, jit=False):
+        self.workloads = workloads
+        self.repeat = repeat
+        self.optimize = optimize
+        self.jit = jit
+
+    def run(self, progress=None) -> dict:
+        """ best time of each phase over the repeats, per workload """
+        results = {}
+        for workload in self.workloads:
+            best = None
+            for _ in range(self.repeat):
+                timing = self.__time(workload)
+                if best is None:
+                    best = timing
+                    continue
+                for (phase, seconds) in timing["phases"].items():
+                    best["phases"][phase] = min(best["phases"][phase], seconds)
+            results[workload.name] = best
+            if progress is not None:
+                progress(workload.name, best)
+
+        return {
+            "version": PLAS_VERSION,
+            "python": platform.python_version(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": self.repeat,
+            "optimize": self.optimize,
+            "jit": self.jit,
+            "workloads": results
+        }
+
+    def __time(self, workload) -> dict:
+        clock = time.perf_counter
+        phases = {}
+        result = {"lines": workload.source.count("\n") + 1, "phases": phases}
+        lines = workload.source.split("\n")
+
+        start = clock()
+        preprocessed = list(Preprocessor.stream(lines))
+        phases["preprocess"] = clock() - start
+
+        start = clock()
+        tokens = list(Tokenizer.stream(preprocessed))
+        phases["tokenize"] = clock() - start
+        result["tokens"] = sum(len(line_tokens) for (_, line_tokens) in tokens)
+
+        start = clock()
+        try:
+            parser = Parser(tokens)
+        except PlasError as error:
+            # a program rejected by the parser still times the phases before it
+            phases["parse"] = clock() - start
+            result["error"] = str(error)
+            return result
+        phases["parse"] = clock() - start
+
+        start = clock()
+        program = Program(parser.get_raw_instructions(), workload.name, parser.get_labels(), parser.get_raw_data())
+        if self.optimize:
+            program.optimize(self.optimize)
+        phases["compile"] = clock() - start
+        result["instructions"] = len(program)
+
+        output = OutputChannel(BytesSink(), policy=FlushPolicy.EXIT)
+        start = clock()
+        try:
+            result["exit_code"] = PVM(program, output, self.jit).run()
+        except PlasError as error:
+            result["exit_code"] = error.exit_code
+        phases["run"] = clock() - start
+        return result
+
+    @staticmethod
+    def write(results: dict, file):
+        with open(file, "w") as f:
+            json.dump(results, f, indent=2)
+
+    @staticmethod
+    def load(file) -> dict:
+        with open(file) as f:
+            return json.load(f)
+
+    @staticmethod
+    def compare(baseline: dict, current: dict, threshold=0.25, floor=0.005) -> list:
+        """ (workload, phase, baseline seconds, current seconds) of every phase
+        slower than the baseline by more than threshold. phases faster than
+        floor seconds in both runs are left out, they are mostly noise """
+        regressions = []
+        for (name, result) in current["workloads"].items():
+            before = baseline["workloads"].get(name)
+            if before is None:
+                continue
+            for (phase, seconds) in result["phases"].items():
+                old = before["phases"].get(phase)
+                if old is None or max(old, seconds) < floor:
+                    continue
+                if seconds > old * (1 + threshold):
+                    regressions.append((name, phase, old, seconds))
+        return regressions
+
+    @staticmethod
+    def table(results: dict) -> str:
+        text = "%-28s" % "workload" + "".join("%12s" % phase for phase in Benchmark.PHASES) + "\n"
+        for (name, result) in results["workloads"].items():
+            phases = result["phases"]
+            text += "%-28s" % name
+            text += "".join("%12s" % ("%.6f" % phases[phase] if phase in phases else "-") for phase in Benchmark.PHASES)
+            text += "\n"
+        return text
@@ -0,0 +1,95 @@
+import os
+import marshal
+import hashlib
+
+from .token_unit import Token
+
+
+class ProgramCache:
+    """ compiled program cache (.plasc) keyed by source hash and interpreter version """
+    MAGIC = b"PLASC\x00"
+    EXTENSION = ".plasc"
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, file: str, version: str, cache_dir: str = None):
+        self.file = file
+        self.version = version
+        self.digest = ProgramCache.file_digest(file, version)
+        if cache_dir is None:
+            # stored next to the source, like prog.plas -> prog.plasc
+            self.path = os.path.splitext(file)[0] + ProgramCache.EXTENSION
+        else:
+            self.path = os.path.join(cache_dir, self.digest + ProgramCache.EXTENSION)
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def file_digest(file: str, version: str) -> str:
+        """ hash of the source content and the interpreter version, read in chunks """
+        sha = hashlib.sha256()
+        sha.update(version.encode("utf-8"))
+        sha.update(b"\x00")
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(ProgramCache.CHUNK_SIZE), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def load(self):
+        """ returns the cached (address table, labels, data table) or None when missing or stale """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if not data.startswith(ProgramCache.MAGIC):
+            return None
+        try:
+            payload = marshal.loads(data[len(ProgramCache.MAGIC):])
+        except (EOFError, ValueError, TypeError):
+            return None
+        # the version comes first in every payload shape, older shapes
+        # are turned down before they are unpacked
+        if not isinstance(payload, tuple) or not payload or not payload[0] == self.version:
+            return None
+        try:
+            version, digest, entries, labels, regions = payload
+            if not digest == self.digest:
+                return None
+            return ProgramCache.__unpack(entries), labels, ProgramCache.__unpack(regions)
+        except (ValueError, TypeError):
+            return None
+
+    def store(self, instructions: dict, labels: dict = None, data: dict = None) -> bool:
+        """ writes the address table, the label lines and the data directives,
+        a failed write only costs the next warm start """
+        payload = marshal.dumps((self.version, self.digest, ProgramCache.__pack(instructions), labels or {},
+                                 ProgramCache.__pack(data or {})))
+        temporary = self.path + ".tmp%d" % os.getpid()
+        try:
+            if self.cache_dir is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temporary, "wb") as f:
+                f.write(ProgramCache.MAGIC)
+                f.write(payload)
+            os.replace(temporary, self.path)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return False
+        return True
+
+    # address ordered tuple of (line, ((type, data), ...))
+    @staticmethod
+    def __pack(instructions: dict) -> tuple:
+        entries = []
+        for address in range(len(instructions)):
+            tokens, line = instructions[address]
+            entries.append((line, tuple((token.get_type(), token.get_data()) for token in tokens)))
+        return tuple(entries)
+
+    @staticmethod
+    def __unpack(entries: tuple) -> dict:
+        instructions = {}
+        for (address, (line, tokens)) in enumerate(entries):
+            instructions[address] = ([Token.create_from(t, d) for (t, d) in tokens], line)
+        return instructions
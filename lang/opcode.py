@@ -0,0 +1,134 @@
+from .token_unit import TokenType
+
+
+# PAS instructions
+class INSTRUCTION_ID:
+    PUTC = 0X001
+    LOAD = 0X002
+    GO = 0X003
+    EXIT = 0X004
+    EVAL = 0X005
+    IFEQ = 0X006
+    IFNE = 0X007
+    IFGT = 0X008
+    IFLT = 0X009
+    IFGE = 0X00A
+    IFLE = 0X00B
+    ADD = 0X00C
+    SUB = 0X00D
+    MUL = 0X00E
+    IDIV = 0X00F
+    DIV = 0x010
+    HOME = 0x011
+    LOG = 0x012
+    DATA = 0x013
+    LOADW = 0x014
+    STOREW = 0x015
+    LOADB = 0x016
+    STOREB = 0x017
+
+
+# internal instructions written by the optimizer, never by source code.
+# each one stands for a run of source instructions starting at its own
+# address and carries the address to continue at, so the instructions
+# it covers stay in place and jumps into them still work
+class FUSED_ID:
+    EVAL_BRANCH = 0x101  # eval + ifXX: op1 op2 mask target next
+    LOAD_CONST = 0x102  # load + add/sub/mul on constants: register value next
+    JUMP = 0x103  # jump that leaves the home return address alone: target
+
+
+# comparison state left by eval, one bit per outcome. zero means
+# nothing has been evaluated yet
+class Comparison:
+    NONE = 0x00
+    LT = 0x01
+    EQ = 0x02
+    GT = 0x04
+
+
+# operand kinds as bits of an operand mask, one bit per token type
+class Operand:
+    MEM = 1 << TokenType.TKN_MEM
+    VAL = 1 << TokenType.TKN_VAL
+    ADR = 1 << TokenType.TKN_ADR
+
+
+class Opcode:
+    """ descriptor of one instruction. internal instructions have no
+    mnemonic and no operand masks. handler is the vm method running it.
+    a directive is read by the parser and never runs, its last operand
+    may repeat """
+    __slots__ = ("mnemonic", "id", "operands", "handler", "directive")
+
+    def __init__(self, mnemonic, opcode_id, operands, directive=False):
+        self.mnemonic = mnemonic
+        self.id = opcode_id
+        self.operands = operands  # one mask per operand, None for internal instructions
+        self.handler = None
+        self.directive = directive
+
+    def types(self, position) -> list:
+        """ token types allowed at an operand position, lowest first """
+        return [token_type for token_type in range(self.operands[position].bit_length())
+                if self.operands[position] >> token_type & 1]
+
+
+# every instruction in one place, the tokenizer, the parser and the vm
+# all read it so adding an instruction is a single entry here plus its
+# handler in the vm
+class OpcodeTable:
+    OPCODES = (
+        Opcode("putc", INSTRUCTION_ID.PUTC, (Operand.MEM,)),
+        Opcode("load", INSTRUCTION_ID.LOAD, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("go", INSTRUCTION_ID.GO, (Operand.ADR,)),
+        Opcode("exit", INSTRUCTION_ID.EXIT, (Operand.MEM | Operand.VAL,)),
+        Opcode("eval", INSTRUCTION_ID.EVAL, (Operand.MEM | Operand.VAL, Operand.MEM | Operand.VAL)),
+        Opcode("ifeq", INSTRUCTION_ID.IFEQ, (Operand.ADR,)),
+        Opcode("ifne", INSTRUCTION_ID.IFNE, (Operand.ADR,)),
+        Opcode("ifgt", INSTRUCTION_ID.IFGT, (Operand.ADR,)),
+        Opcode("iflt", INSTRUCTION_ID.IFLT, (Operand.ADR,)),
+        Opcode("ifge", INSTRUCTION_ID.IFGE, (Operand.ADR,)),
+        Opcode("ifle", INSTRUCTION_ID.IFLE, (Operand.ADR,)),
+        Opcode("add", INSTRUCTION_ID.ADD, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("sub", INSTRUCTION_ID.SUB, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("mul", INSTRUCTION_ID.MUL, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("idiv", INSTRUCTION_ID.IDIV, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("div", INSTRUCTION_ID.DIV, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("home", INSTRUCTION_ID.HOME, ()),
+        Opcode("log", INSTRUCTION_ID.LOG, (Operand.MEM,)),
+        Opcode("data", INSTRUCTION_ID.DATA, (Operand.VAL, Operand.VAL), directive=True),
+        Opcode("loadw", INSTRUCTION_ID.LOADW, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("storew", INSTRUCTION_ID.STOREW, (Operand.MEM | Operand.VAL, Operand.MEM | Operand.VAL)),
+        Opcode("loadb", INSTRUCTION_ID.LOADB, (Operand.MEM, Operand.MEM | Operand.VAL)),
+        Opcode("storeb", INSTRUCTION_ID.STOREB, (Operand.MEM | Operand.VAL, Operand.MEM | Operand.VAL)),
+        Opcode(None, FUSED_ID.EVAL_BRANCH, None),
+        Opcode(None, FUSED_ID.LOAD_CONST, None),
+        Opcode(None, FUSED_ID.JUMP, None)
+    )
+    BY_ID = {opcode.id: opcode for opcode in OPCODES}
+    # comparison outcomes each ifXX jumps on
+    BRANCH_MASKS = {
+        INSTRUCTION_ID.IFEQ: Comparison.EQ,
+        INSTRUCTION_ID.IFNE: Comparison.LT | Comparison.GT,
+        INSTRUCTION_ID.IFGT: Comparison.GT,
+        INSTRUCTION_ID.IFLT: Comparison.LT,
+        INSTRUCTION_ID.IFGE: Comparison.GT | Comparison.EQ,
+        INSTRUCTION_ID.IFLE: Comparison.LT | Comparison.EQ
+    }
+    BY_MNEMONIC = {opcode.mnemonic: opcode for opcode in OPCODES if opcode.mnemonic is not None}
+
+    @staticmethod
+    def handles(opcode_id):
+        """ decorator making a vm method the handler of an opcode """
+        def bind(handler):
+            OpcodeTable.BY_ID[opcode_id].handler = handler
+            return handler
+        return bind
+
+    @staticmethod
+    def check_handlers():
+        """ raises when an opcode was left without a handler """
+        for opcode in OpcodeTable.OPCODES:
+            if opcode.handler is None and not opcode.directive:
+                raise TypeError("opcode 0x%x %s has no handler" % (opcode.id, opcode.mnemonic or "(internal)"))
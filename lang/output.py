@@ -0,0 +1,180 @@
+import io
+import sys
+import collections
+
+
+class FlushPolicy:
+    """ when a buffered output channel hands its text to the sink """
+    LINE = "line"  # flush after every newline
+    BLOCK = "block"  # flush once buffer_size characters are pending
+    EXIT = "exit"  # hold everything until flush/close on exit or error
+
+    policies = (LINE, BLOCK, EXIT)
+
+
+class StdoutSink:
+    """ writes to the current sys.stdout """
+
+    def write(self, text: str):
+        sys.stdout.write(text)
+
+    def flush(self):
+        sys.stdout.flush()
+
+    def close(self):
+        self.flush()
+
+
+class FileSink:
+    """ writes to a file path or an already open text file """
+
+    def __init__(self, file, encoding: str = "utf-8"):
+        self.__owned = isinstance(file, str)
+        self.file = open(file, "w", encoding=encoding) if self.__owned else file
+
+    def write(self, text: str):
+        self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.__owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class BytesSink:
+    """ keeps the output in memory as encoded bytes """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self.buffer = io.BytesIO()
+
+    def write(self, text: str):
+        self.buffer.write(text.encode(self.encoding))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def getvalue(self) -> bytes:
+        """ returns everything written so far """
+        return self.buffer.getvalue()
+
+
+class CallbackSink:
+    """ passes every flushed chunk of text to a callable """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, text: str):
+        self.callback(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class OutputChannel:
+    """ buffered output of the vm, putc and log write here instead of sys.stdout """
+    DEFAULT_BUFFER_SIZE = 8192
+
+    def __init__(self, sink=None, buffer_size: int = DEFAULT_BUFFER_SIZE, policy: str = FlushPolicy.BLOCK):
+        if policy not in FlushPolicy.policies:
+            raise ValueError("unknown flush policy %s" % policy)
+
+        self.sink = sink if sink is not None else StdoutSink()
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.__buffer = []
+        self.__size = 0
+
+        # the policy is fixed per channel, so pick the write path once
+        if policy == FlushPolicy.LINE:
+            self.write = self.__write_line
+        elif policy == FlushPolicy.BLOCK:
+            self.write = self.__write_block
+        else:
+            self.write = self.__write_held
+
+    def __write_line(self, text: str):
+        self.__buffer.append(text)
+        if "\n" in text:
+            self.flush()
+
+    def __write_block(self, text: str):
+        self.__buffer.append(text)
+        self.__size += len(text)
+        if self.__size >= self.buffer_size:
+            self.flush()
+
+    def __write_held(self, text: str):
+        self.__buffer.append(text)
+
+    def flush(self):
+        """ hands the pending text to the sink """
+        if self.__buffer:
+            self.sink.write("".join(self.__buffer))
+            self.__buffer.clear()
+            self.__size = 0
+        self.sink.flush()
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+
+class AsyncQueueSink:
+    """ puts every flushed chunk of text on an asyncio.Queue. writes only
+    collect the text, an async run awaits drain() between slices which
+    waits while the queue is full """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.__pending = collections.deque()
+
+    def write(self, text: str):
+        self.__pending.append(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def drain(self):
+        """ hands the collected chunks to the queue in order """
+        while self.__pending:
+            await self.queue.put(self.__pending.popleft())
+
+
+class AsyncStreamSink:
+    """ writes to an asyncio StreamWriter, drain() waits for its buffer """
+
+    def __init__(self, writer, encoding: str = "utf-8"):
+        self.writer = writer
+        self.encoding = encoding
+        self.__pending = []
+
+    def write(self, text: str):
+        self.__pending.append(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def drain(self):
+        """ hands the collected text to the writer and waits until it has room again """
+        if self.__pending:
+            self.writer.write("".join(self.__pending).encode(self.encoding))
+            self.__pending.clear()
+        await self.writer.drain()
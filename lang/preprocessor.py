@@ -5,33 +5,32 @@ class Preprocessor:
         self.__preprocess()
 
     def __preprocess(self):
+        for pre in Preprocessor.stream(self.source.split('\n')):
+            self.preprocessed.append(pre)
+
+    @staticmethod
+    def stream(lines):
+        """ yields [code, line] for each code line of an iterable of source lines """
         line = 1
-        for stream in self.source.split('\n'):
-            clean_stream = ""
-            stream = stream.strip().replace('\t', ' ')
-            if stream.startswith("#"):
-                line += 1
-                continue
+        for stream in lines:
+            clean_stream = Preprocessor.clean(stream)
+            if not clean_stream == "":
+                yield [clean_stream, line]
+            line += 1
 
-            if stream == "" or stream is None:
-                line += 1
-                continue
+    @staticmethod
+    def clean(stream: str) -> str:
+        """ strips a single source line of comments and repeated spaces """
+        stream = stream.strip().replace('\t', ' ')
+        if stream.startswith("#"):
+            return ""
 
-            # clean space and comment after a code
-            space_seen = False
-            for c in stream:
-                if c == '#':
-                    break
-                if not c == chr(0x20) or not space_seen:
-                    clean_stream += c
-                    space_seen = False
-                if c == chr(0x20):
-                    space_seen = True
+        if stream == "" or stream is None:
+            return ""
 
-            self.preprocessed.append([clean_stream.strip(), line])
-            line += 1
+        # clean space and comment after a code
+        code = stream.split('#', 1)[0]
+        return " ".join(part for part in code.split(' ') if part).strip()
 
     def get_preprocessed(self) -> list:
         return self.preprocessed
-
-
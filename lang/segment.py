@@ -0,0 +1,52 @@
+import mmap
+import array
+
+
+class DataSegment:
+    """ linear data memory of the vm. one buffer seen both as bytes and as
+    64 bit signed words in native byte order, word i covers the bytes
+    8 * i to 8 * i + 7. the buffer is a bytearray or an mmap of a file """
+    WORD_SIZE = 8
+    WORD_MIN = -(1 << 63)
+    WORD_MAX = (1 << 63) - 1
+    DEFAULT_SIZE = 1 << 16  # bytes given to a program using data memory
+
+    def __init__(self, size: int = DEFAULT_SIZE, buffer=None, writable: bool = True):
+        if buffer is None:
+            # rounded up to whole words
+            buffer = bytearray(-(-size // DataSegment.WORD_SIZE) * DataSegment.WORD_SIZE)
+        self.buffer = buffer
+        self.writable = writable
+        self.bytes = memoryview(buffer)
+        self.words = self.bytes[:len(self.bytes) - len(self.bytes) % DataSegment.WORD_SIZE].cast("q")
+
+    @staticmethod
+    def map(file: str, writable: bool = True) -> "DataSegment":
+        """ a segment over the content of a file without reading it in.
+        stores go straight to the file unless writable is False, then
+        they fail. raises OSError, ValueError for an empty file """
+        with open(file, "r+b" if writable else "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        return DataSegment(buffer=mapped, writable=writable)
+
+    def __len__(self):
+        return len(self.bytes)
+
+    def initialize(self, regions):
+        """ writes (word, values) regions, raises IndexError when one does not fit """
+        for (word, values) in regions:
+            if word + len(values) > len(self.words):
+                raise IndexError("words %d to %d are outside the segment" % (word, word + len(values) - 1))
+            self.words[word:word + len(values)] = array.array("q", values)
+
+    def flush(self):
+        """ writes a mapped segment back to its file """
+        if isinstance(self.buffer, mmap.mmap) and self.writable:
+            self.buffer.flush()
+
+    def close(self):
+        self.flush()
+        self.words.release()
+        self.bytes.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
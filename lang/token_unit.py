@@ -26,9 +26,11 @@ class TokenType:
 
 
 class Token:
-    def __init__(self):
-        self.tokenType = None
-        self.tokenData = None
+    __slots__ = ("tokenType", "tokenData")
+
+    def __init__(self, token_type=None, token_data=None):
+        self.tokenType = token_type
+        self.tokenData = token_data
 
     def set_type(self, token_type):
         self.tokenType = token_type
@@ -44,10 +46,7 @@ class Token:
 
     @classmethod
     def create_from(cls, token_type, token_data):
-        token = Token()
-        token.set_type(token_type)
-        token.set_data(token_data)
-        return token
+        return Token(token_type, token_data)
 
     def __str__(self):
         return "<TYPE {0} ({1}), DATA {2}>".format(self.get_type(), TTC.get_type(self.get_type()), self.get_data())
@@ -1,48 +1,60 @@
 import re
 from .token_unit import TokenType
 from .token_unit import Token
+from .opcode import OpcodeTable
 from .util import ASCIIHelper
 
 
 class TokenMatcher:
-    def __init__(self, token):
-        self.__ins_regex = r"(putc|load|go|exit|eval|ifeq|ifne|ifgt|iflt|ifge|ifle|add|sub|mul|idiv|div|home|log|data)"
-        self.__mem_regex = r"\$([0-9]|[a-f])"
-        self.__val_regex = r'\-?([0-9]+|[0-9]*)\.?([0-9]*|[0-9]+)'
-        self.__lbl_regex = r"[a-zA-Z_]+[a-zA-Z0-9_]*"
-        self.__sym_regex = ASCIIHelper.SYM_REGEX
+    INS_REGEX = r"(?:" + "|".join(OpcodeTable.BY_MNEMONIC) + ")"
+    MEM_REGEX = r"\$(?:[0-9]|[a-f])"
+    VAL_REGEX = r"\-?(?:[0-9]+|[0-9]*)\.?(?:[0-9]*|[0-9]+)"
+    LBL_REGEX = r"[a-zA-Z_]+[a-zA-Z0-9_]*"
+    SYM_REGEX = ASCIIHelper.SYM_REGEX
+
+    # every token class in one alternation, tried in priority order
+    __CLASSIFIER = re.compile(
+        "(?P<ins>" + INS_REGEX + ")|" +
+        "(?P<mem>" + MEM_REGEX + ")|" +
+        "(?P<val>" + VAL_REGEX + ")|" +
+        "(?P<lbl>" + LBL_REGEX + ")|" +
+        "(?P<sym>" + SYM_REGEX + ")"
+    )
+    __GROUP_TYPES = {
+        "ins": TokenType.TKN_INS,
+        "mem": TokenType.TKN_MEM,
+        "val": TokenType.TKN_VAL,
+        "lbl": TokenType.TKN_LBL,
+        "sym": TokenType.TKN_SYM
+    }
 
+    def __init__(self, token):
         self.token = token
         self.tkn = Token()
         self.tkn.set_data(self.token)
 
-    def get_token_type(self):
-        if re.fullmatch(self.__ins_regex, self.token):
-            self.tkn.set_type(TokenType.TKN_INS)
-        elif re.fullmatch(self.__mem_regex, self.token):
-            self.tkn.set_type(TokenType.TKN_MEM)
-        elif re.fullmatch(self.__val_regex, self.token):
-            self.tkn.set_type(TokenType.TKN_VAL)
-        elif re.fullmatch(self.__lbl_regex, self.token):
-            self.tkn.set_type(TokenType.TKN_LBL)
-        elif re.fullmatch(self.__sym_regex, self.token):
-            self.tkn.set_type(TokenType.TKN_SYM)
-        else:
-            self.tkn.set_type(TokenType.TKN_ERR)
+    @staticmethod
+    def classify(token: str) -> int:
+        """ returns the token type of a single formatted token """
+        match = TokenMatcher.__CLASSIFIER.fullmatch(token)
+        if match is None:
+            return TokenType.TKN_ERR
+        return TokenMatcher.__GROUP_TYPES[match.lastgroup]
 
+    def get_token_type(self):
+        self.tkn.set_type(TokenMatcher.classify(self.token))
         return self.tkn
 
 
 class Tokenizer:
+    # a word is a run of alphanumerics and _ $ - . and any other
+    # non space character stands as a token of its own
+    __SCANNER = re.compile(r"[a-zA-Z0-9_$.\-]+|[^ ]")
+    WORD_CACHE_SIZE = 4096  # words kept classified, the cache starts over once it is full
+
     def __init__(self, source_stream):
         self.ss = source_stream
-        self.codes = []
-        self.lines = []
         self.tokens = {}
-        for __ss in self.ss:
-            self.codes.append(__ss[0])
-            self.lines.append(__ss[1])
-
         self.__tokenize()
 
     def to_file(self, file):
@@ -68,40 +80,29 @@ class Tokenizer:
         return self.tokens
 
     def __tokenize(self):
-        lp = 0
-        for code in self.codes:
-            formatted_code = Tokenizer.__pas_formatter(code)
-            fcl = []
-            for fc in formatted_code:
-                fcl.append(TokenMatcher(fc).get_token_type())
+        for (line, fcl) in Tokenizer.stream(self.ss):
+            self.tokens[line] = fcl
 
-            self.tokens[self.lines[lp]] = fcl
-            lp += 1
+    @staticmethod
+    def stream(source_stream):
+        """ yields (line, tokens) for each [code, line] without keeping them """
+        types = {}  # word -> (type, word) cache, most words repeat
+        for (code, line) in source_stream:
+            # labels and values of generated programs rarely repeat, so
+            # the cache is bounded instead of growing with the file
+            if len(types) >= Tokenizer.WORD_CACHE_SIZE:
+                types.clear()
+            yield line, Tokenizer.__scan(code, types)
 
+    # split and classify one line in a single pass
     @staticmethod
-    def __pas_formatter(code: str) -> list:
-        formatted = []
-        data = ""
-        for char in code:
-            if ASCIIHelper.is_alphanum(char):
-                data += char
-            else:
-                if char == '_' or char == '$' or char == '-' or char == '.':
-                    data += char
-                elif char == ' ':
-                    if data == "":
-                        continue
-                    else:
-                        formatted.append(data)
-                        data = ""
-                else:
-                    if data == "":
-                        formatted.append(char)
-                    else:
-                        formatted.append(data)
-                        formatted.append(char)
-                        data = ""
-        if not data == "":
-            formatted.append(data)
-
-        return formatted
+    def __scan(code: str, types: dict) -> list:
+        fcl = []
+        for word in Tokenizer.__SCANNER.findall(code):
+            known = types.get(word)
+            if known is None:
+                # the first copy of a word is shared by all later tokens
+                known = types[word] = (TokenMatcher.classify(word), word)
+            fcl.append(Token(known[0], known[1]))
+
+        return fcl
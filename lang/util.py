@@ -13,17 +13,28 @@ class SourceStream:
             sys.stdout.write("source stream not found\n")
             return
 
-        self.stream = ""
-        self.__read_stream()
+        self.stream = None
 
     def __read_stream(self):
         with open(self.file, "r") as f:
-            self.stream += f.read()
+            self.stream = f.read()
 
     def get_stream(self) -> str:
-        """ returns the source code stream """
+        """ returns the source code stream, the whole file is read on first use """
+        if self.stream is None:
+            self.__read_stream()
         return self.stream
 
+    def lines(self):
+        """ yields the source one line at a time without holding the whole file """
+        with open(self.file, "r") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def is_empty(self) -> bool:
+        """ checks if the source file has no content """
+        return os.path.getsize(self.file) == 0
+
     def __str__(self) -> str:
         return self.stream
 
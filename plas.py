@@ -1,7 +1,23 @@
 #!/bin/python3
+import io
 import sys
 import os
 import re
+import csv
+import glob
+import bisect
+import heapq
+import json
+import time
+import signal
+import types
+import hashlib
+import marshal
+import tracemalloc
+import argparse
+import contextlib
+import multiprocessing
+import concurrent.futures
 
 from lang.log import Log
 
@@ -11,6 +27,16 @@ from lang.token_unit import Token
 from lang.token_unit import TokenType
 from lang.token_unit import TTC
 from lang.preprocessor import Preprocessor
+from lang.cache import ProgramCache
+from lang.opcode import INSTRUCTION_ID
+from lang.opcode import FUSED_ID
+from lang.opcode import OpcodeTable
+from lang.opcode import Comparison
+from lang.output import OutputChannel
+from lang.output import FileSink
+from lang.output import FlushPolicy
+from lang.output import BytesSink
+from lang.segment import DataSegment
 
 """
 @author: Naol Dereje
@@ -23,28 +49,10 @@ we can store any kind of numbers except strings. Instructions are executed line
 so you can have the instructions from INSTRUCTION_ID class.
 """
 
-
-# PAS instructions
-class INSTRUCTION_ID:
-    PUTC = 0X001
-    LOAD = 0X002
-    GO = 0X003
-    EXIT = 0X004
-    EVAL = 0X005
-    IFEQ = 0X006
-    IFNE = 0X007
-    IFGT = 0X008
-    IFLT = 0X009
-    IFGE = 0X00A
-    IFLE = 0X00B
-    ADD = 0X00C
-    SUB = 0X00D
-    MUL = 0X00E
-    IDIV = 0X00F
-    DIV = 0x010
-    HOME = 0x011
-    LOG = 0x012
-    DATA = 0x013
+# interpreter version, part of the compiled program cache key and of
+# snapshots. bump it whenever the .plasc payload or the snapshot layout
+# changes so older files are turned down by their version
+PLAS_VERSION = "0.2.0"
 
 
 # for now there is no support for floating point 
@@ -52,27 +60,7 @@ class INSTRUCTION_ID:
 # floating point memory and operations on them
 # instruction table for accessing instantly
 class InstructionTable:
-    INS = {
-        "putc": INSTRUCTION_ID.PUTC,
-        "load": INSTRUCTION_ID.LOAD,
-        "go": INSTRUCTION_ID.GO,
-        "exit": INSTRUCTION_ID.EXIT,
-        "eval": INSTRUCTION_ID.EVAL,
-        "ifeq": INSTRUCTION_ID.IFEQ,
-        "ifne": INSTRUCTION_ID.IFNE,
-        "ifgt": INSTRUCTION_ID.IFGT,
-        "iflt": INSTRUCTION_ID.IFLT,
-        "ifge": INSTRUCTION_ID.IFGE,
-        "ifle": INSTRUCTION_ID.IFLE,
-        "add": INSTRUCTION_ID.ADD,
-        "sub": INSTRUCTION_ID.SUB,
-        "mul": INSTRUCTION_ID.MUL,
-        "idiv": INSTRUCTION_ID.IDIV,
-        "div": INSTRUCTION_ID.DIV,
-        "home": INSTRUCTION_ID.HOME,
-        "log": INSTRUCTION_ID.LOG,
-        "data": INSTRUCTION_ID.DATA
-    }
+    INS = {mnemonic: opcode.id for (mnemonic, opcode) in OpcodeTable.BY_MNEMONIC.items()}
 
 
 # __memory address table found in pas
@@ -92,56 +80,79 @@ class FMT:
     FGE = 4  # flag greater than or equal index
     FLE = 5  # flag less than or equal index
 
+    # comparison state left by eval, one bit per outcome.
+    # zero means nothing has been evaluated yet
+    CMP_NONE = Comparison.NONE
+    CMP_LT = Comparison.LT
+    CMP_EQ = Comparison.EQ
+    CMP_GT = Comparison.GT
+
+    # comparison outcomes for which each flag is set, the ones its ifXX jumps on
+    FEQ_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFEQ]
+    FNE_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFNE]
+    FGT_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFGT]
+    FLT_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFLT]
+    FGE_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFGE]
+    FLE_MASK = OpcodeTable.BRANCH_MASKS[INSTRUCTION_ID.IFLE]
+    masks = {
+        "feq": FEQ_MASK,
+        "fne": FNE_MASK,
+        "fgt": FGT_MASK,
+        "flt": FLT_MASK,
+        "fge": FGE_MASK,
+        "fle": FLE_MASK
+    }
+
 
 # an object for storing flags
-# used after evaluation process
+# used after evaluation process. eval records a single comparison
+# state and every flag is derived from it with one mask test
 class FlagMemory:
     def __init__(self):
-        self.feq = False
-        self.fne = False
-        self.fgt = False
-        self.flt = False
-        self.fge = False
-        self.fle = False
-        self.__fmem = {
-            "feq": False,
-            "fne": False,
-            "fgt": False,
-            "flt": False,
-            "fge": False,
-            "fle": False
-        }
-
-    def enable_flag(self, flag):
-        self.__fmem[flag] = True
+        self.state = FMT.CMP_NONE
 
-    def disable_flag(self, flag):
-        self.__fmem[flag] = False
+    def compare(self, op1, op2):
+        if op1 > op2:
+            self.state = FMT.CMP_GT
+        elif op1 == op2:
+            self.state = FMT.CMP_EQ
+        else:
+            self.state = FMT.CMP_LT
 
     def get_flag(self, flag):
-        return self.__fmem[flag]
+        return bool(self.state & FMT.masks[flag])
 
     def flags(self):
-        return self.__fmem
+        return {flag: bool(self.state & mask) for (flag, mask) in FMT.masks.items()}
 
 
-# an object where instructions are stored accordingly
+# an object where instructions are stored accordingly.
+# addresses are contiguous from 0x0 so they index plain lists
 class InstructionMemory:
     def __init__(self):
-        self.__memory = {}
+        self.__memory = []
+        self.__lines = []
 
     def i_at(self, address):
         return self.__memory[address]
 
-    def i_set(self, address, instruction):
+    def i_set(self, address, instruction, line=None):
+        if address == len(self.__memory):
+            self.__memory.append(instruction)
+            self.__lines.append(line)
+            return
         self.__memory[address] = instruction
+        self.__lines[address] = line
 
     def i_line(self, address):
-        return self.__memory[address]
+        return self.__lines[address]
+
+    def __len__(self):
+        return len(self.__memory)
 
     def __str__(self):
         result = ""
-        for (address, instructions) in self.__memory.items():
+        for (address, instructions) in enumerate(self.__memory):
             instruction_data = ""
             for instruction in instructions:
                 instruction_data += " " + str(instruction)
@@ -200,251 +211,542 @@ class ALOperation:
 # Plas Virtual Machine
 # a place where instructions are executed
 class PVM:
-    def __init__(self, raw_instruction):
-        self.__raw_instruction = raw_instruction
+    CALL_DEPTH = 1024  # nested calls before a go fails with a stack overflow
+    UNBOUNDED = sys.maxsize  # jit loop passes outside of step
+
+    def __init__(self, program, output=None, jit=False, profile=None, trace=None, count=False,
+                 call_depth=CALL_DEPTH, data=None):
+        if profile is not None and trace is not None:
+            raise ValueError("a run is either profiled or traced")
+        # a raw parser address table is compiled on the spot
+        self.program = program if isinstance(program, Program) else Program(program)
+        self.__insmem = self.program.memory  # instruction memory
+        self.__output = output if output is not None else OutputChannel()  # putc and log output
+        self.__write = self.__output.write
         self.__amem = AbstractMemory()  # abstract memory
+        self.__registers = self.__amem.registers  # indexed register file
         self.__fmem = FlagMemory()  # flag memory
-        self.__insmem = InstructionMemory()  # instruction memory
-        self.__pvm_operations = (
-            self.__ins_putc,
-            self.__ins_load,
-            self.__ins_go,
-            self.__ins_exit,
-            self.__ins_eval,
-            self.__ins_ifeq,
-            self.__ins_ifne,
-            self.__ins_ifgt,
-            self.__ins_iflt,
-            self.__ins_ifge,
-            self.__ins_ifle,
-            self.__ins_add,
-            self.__ins_sub,
-            self.__ins_mul,
-            self.__ins_idiv,
-            self.__ins_div,
-            self.__ins_home,
-            self.__ins_log
-        )
-
-        self.__init_instruction_memory()
-        self.total_ins = len(self.__raw_instruction.keys())
+        self.call_stack = [0] * call_depth  # address of the go of every call in progress, bounded up front
+        # data memory, a DataSegment given as data is shared with the caller
+        self.data = data if data is not None else DataSegment(self.program.data_size())
+        self.__words = self.data.words
+        self.__bytes = self.data.bytes
+        # handlers come from the opcode table, bound to this vm once
+        self.__operations = {opcode.id: opcode.handler.__get__(self)
+                             for opcode in OpcodeTable.OPCODES if not opcode.directive}
+
+        self.__dispatch = self.__decode_instructions()
+        self.total_ins = len(self.__insmem)
+        self.profile = profile  # Profile filled in by run, it replaces the jit
+        self.trace = trace  # ExecutionTrace filled in by run, it replaces the jit too
+        self.count = count  # count dispatched instructions into executed, a jit trace counts once
+        self.executed = None
+        self.jit = jit and profile is None and trace is None
+        self.trace_passes = PVM.UNBOUNDED  # passes a compiled jit loop may still make before it returns
+        if self.jit:
+            # recording runs the plain handlers, the dispatch table gets
+            # counting backward jumps and later the compiled traces
+            self.__interpreted = list(self.__dispatch)
+            self.__compiler = TraceCompiler(self.__insmem, self.program.name, call_depth, self.data)
+            self.__hot_loops = {}  # loop header -> taken backward jumps
+            self.__aborts = {}  # loop header -> failed recordings
+            self.traces = {}  # loop header -> compiled trace
+            self.__count_backward_jumps()
+        self.reset()
+
+    def reset(self):
+        """ clears registers, flags and addresses for a fresh run of the same
+        program and writes its data directives, the rest of the data memory
+        keeps what it holds """
+        for (word, values, line) in self.program.data:
+            if not self.data.writable:
+                raise PlasMemoryError.read_only(line, "data directive")
+            try:
+                self.data.initialize(((word, values),))
+            except IndexError:
+                raise PlasMemoryError.out_of_range(line, len(self.data))
+        self.__registers[:] = [0] * len(self.__registers)
+        self.__fmem.state = FMT.CMP_NONE
         self.instruction_pointer = 0x00000000
-        self.temporary_address = 0x00000000
-        self.__start_execution(self.instruction_pointer)
-        sys.exit(SysExit.EXIT_SUCCESS)
-
-    def __start_execution(self, current_address):
-        if current_address > self.total_ins - 1:
+        self.stack_pointer = 0  # calls in progress, the next free slot of call_stack
+        self.exit_code = SysExit.EXIT_SUCCESS
+
+    def run(self) -> int:
+        """ runs until the program ends or exits and returns the exit code.
+        runtime errors are raised as PlasRuntimeError """
+        if self.profile is not None:
+            self.__start_profiled_execution()
+        elif self.trace is not None:
+            self.__start_traced_execution()
+        elif self.count:
+            self.__start_counted_execution()
+        else:
+            self.__start_execution()
+        return self.exit_code
+
+    def step(self, limit) -> int:
+        """ runs at most limit instructions and returns how many ran, so a
+        caller can interleave the vm with other work and resume it later.
+        a compiled jit trace counts as a single instruction, its loops make
+        at most limit passes over the whole step """
+        program = self.__dispatch
+        total_ins = self.total_ins
+        ran = 0
+        self.trace_passes = limit
+        try:
+            while ran < limit and self.instruction_pointer < total_ins:
+                operation, args = program[self.instruction_pointer]
+                operation(args)
+                ran += 1
+        except BaseException:
+            self.__output.flush()
+            raise
+        finally:
+            self.trace_passes = PVM.UNBOUNDED
+        if self.instruction_pointer >= total_ins:
+            self.__output.flush()
+        return ran
+
+    async def run_async(self, yield_every=1000) -> int:
+        """ runs like run but hands control back to the event loop every
+        yield_every instructions. output going to an async sink is flushed
+        and drained there whatever the flush policy, so a slow consumer
+        holds the program back. cancelling the task stops the program
+        between two slices """
+        drain = getattr(self.__output.sink, "drain", None)
+        while True:
+            try:
+                self.step(yield_every)
+            except PlasRuntimeError:
+                # what was written before the error still goes out
+                if drain is not None:
+                    await drain()
+                raise
+            if drain is not None:
+                self.__output.flush()
+                await drain()
+            if self.finished():
+                return self.exit_code
+            # a drain that did not have to wait never left the task
+            await PVM.__yield_control()
+
+    # hands control to the event loop the way asyncio.sleep(0) does,
+    # without importing asyncio for every synchronous run
+    @staticmethod
+    @types.coroutine
+    def __yield_control():
+        yield
+
+    def snapshot(self) -> "VMSnapshot":
+        """ the state of the vm between two instructions, output excluded.
+        data memory is copied whole, a mapped file included """
+        return VMSnapshot(self.program, tuple(self.__registers), self.__fmem.state,
+                          self.instruction_pointer, tuple(self.call_stack[:self.stack_pointer]), self.exit_code,
+                          bytes(self.__bytes) if len(self.data) else None)
+
+    def restore(self, snapshot):
+        """ continues from a snapshot of a vm running the same program """
+        if snapshot.program is not self.program and snapshot.digest() != self.program.digest():
+            raise ValueError("snapshot of %s does not belong to %s" % (snapshot.program.name, self.program.name))
+        if len(snapshot.calls) > len(self.call_stack):
+            raise ValueError("snapshot holds %d calls, the call stack takes %d" % (
+                len(snapshot.calls), len(self.call_stack)))
+        if snapshot.data is not None:
+            if not len(snapshot.data) == len(self.data):
+                raise ValueError("snapshot holds %d bytes of data, the data segment has %d" % (
+                    len(snapshot.data), len(self.data)))
+            if not self.data.writable:
+                raise ValueError("snapshot data can not be restored to a read only data segment")
+            self.__bytes[:] = snapshot.data
+        self.__registers[:] = snapshot.registers
+        self.__fmem.state = snapshot.state
+        self.instruction_pointer = snapshot.instruction_pointer
+        self.call_stack[:len(snapshot.calls)] = snapshot.calls
+        self.stack_pointer = len(snapshot.calls)
+        self.exit_code = snapshot.exit_code
+
+    def finished(self) -> bool:
+        """ whether the program ran to its end or exited """
+        return self.instruction_pointer >= self.total_ins
+
+    def registers(self) -> dict:
+        return self.__amem.dump()
+
+    def flags(self) -> dict:
+        return self.__fmem.flags()
+
+    # fetch, decode and dispatch loop driven by the instruction pointer.
+    # handlers only move the instruction pointer so the python stack
+    # stays flat no matter how many instructions are executed
+    def __start_execution(self):
+        program = self.__dispatch
+        total_ins = self.total_ins
+        try:
+            while self.instruction_pointer < total_ins:
+                operation, args = program[self.instruction_pointer]
+                operation(args)
+        finally:
+            self.__output.flush()
+
+    # the same loop counting dispatches, kept apart so the plain loop
+    # pays nothing for it
+    def __start_counted_execution(self):
+        program = self.__dispatch
+        total_ins = self.total_ins
+        executed = 0
+        try:
+            while self.instruction_pointer < total_ins:
+                operation, args = program[self.instruction_pointer]
+                executed += 1
+                operation(args)
+        finally:
+            self.executed = executed
+            self.__output.flush()
+
+    # the same loop counting and timing every dispatch, kept apart so
+    # the plain loop pays nothing for it
+    def __start_profiled_execution(self):
+        program = self.__dispatch
+        total_ins = self.total_ins
+        counts = self.profile.counts
+        times = self.profile.times
+        clock = time.perf_counter_ns
+        counted = sum(counts)
+        start = clock()
+        try:
+            while self.instruction_pointer < total_ins:
+                address = self.instruction_pointer
+                operation, args = program[address]
+                counts[address] += 1
+                begin = clock()
+                operation(args)
+                times[address] += clock() - begin
+        finally:
+            self.profile.seconds += (clock() - start) / 1e9
+            self.executed = sum(counts) - counted
+            self.__output.flush()
+
+    # the same loop writing every dispatch into the trace ring. the
+    # instruction raising is kept apart since it left no state behind
+    def __start_traced_execution(self):
+        program = self.__dispatch
+        total_ins = self.total_ins
+        trace = self.trace
+        addresses, values, states, depths = trace.addresses, trace.values, trace.states, trace.depths
+        destinations = trace.destinations
+        registers = self.__registers
+        fmem = self.__fmem
+        size = trace.size
+        position = trace.position
+        address = None
+        try:
+            while self.instruction_pointer < total_ins:
+                address = self.instruction_pointer
+                operation, args = program[address]
+                operation(args)
+                slot = position % size
+                addresses[slot] = address
+                values[slot] = registers[destinations[address]]
+                states[slot] = fmem.state
+                depths[slot] = self.stack_pointer
+                position += 1
+        except BaseException:
+            trace.failed = address
+            raise
+        finally:
+            self.executed = position - trace.position
+            trace.position = position
+            self.__output.flush()
+
+    # bind every address to its handler once
+    def __decode_instructions(self):
+        program = []
+        for address in range(len(self.__insmem)):
+            opcode, args = self.__insmem.i_at(address)
+            program.append((self.__operations[opcode], args))
+        return program
+
+    # wraps every go/ifXX jumping backward so taking it counts towards
+    # its target, the header of a loop
+    def __count_backward_jumps(self):
+        for address in range(self.total_ins):
+            opcode, args = self.__insmem.i_at(address)
+            if opcode == FUSED_ID.EVAL_BRANCH:
+                header = args[3]
+            elif opcode in (INSTRUCTION_ID.GO, FUSED_ID.JUMP) or opcode in OpcodeTable.BRANCH_MASKS:
+                header = args[0][1]
+            else:
+                continue
+            if header <= address:
+                operation, args = self.__dispatch[address]
+                self.__dispatch[address] = (self.__ins_backward_jump, (operation, args, header))
+                self.__hot_loops[header] = 0
+
+    def __ins_backward_jump(self, args):
+        operation, operation_args, header = args
+        operation(operation_args)
+        if self.instruction_pointer == header:
+            self.__hot_loops[header] += 1
+            if self.__hot_loops[header] == TraceCompiler.HOT_LOOP:
+                self.__compile_loop(header)
+
+    def __compile_loop(self, header):
+        recorded = self.__record_trace(header)
+        if recorded is None:
+            self.__aborts[header] = self.__aborts.get(header, 0) + 1
+            if self.__aborts[header] < TraceCompiler.MAX_ABORTS:
+                self.__hot_loops[header] = 0
             return
-        self.__execute__address(current_address)
-        self.__start_execution(self.instruction_pointer)
-
-    def __execute__address(self, address):
-        instruction = self.__insmem.i_at(address)[0]
-        args = self.__insmem.i_at(address)[1:]
-        self.__pvm_operations[instruction - 1](args)
 
+        trace, closed = recorded
+        self.traces[header] = self.__compiler.compile(trace, header, closed)
+        self.__dispatch[header] = (self.__ins_trace, self.traces[header])
+
+    # runs one iteration of the loop on the plain handlers and records
+    # where each instruction went. returns (trace, closed) where closed
+    # tells the trace got back to the header, or None when recording
+    # ran into an instruction it cannot trace or got too long
+    def __record_trace(self, header):
+        trace = []
+        interpreted = self.__interpreted
+        while len(trace) < TraceCompiler.MAX_LENGTH:
+            address = self.instruction_pointer
+            if address >= self.total_ins or not TraceCompiler.traceable(self.__insmem.i_at(address)[0]):
+                return None
+            if trace and address in self.traces:
+                # an inner loop already has a trace, hand over to it
+                return trace, False
+            operation, args = interpreted[address]
+            operation(args)
+            trace.append((address, self.instruction_pointer))
+            if self.instruction_pointer == header:
+                return trace, True
+        return None
+
+    @OpcodeTable.handles(INSTRUCTION_ID.PUTC)
     def __ins_putc(self, args):
-        op1 = chr(int(self.__amem.getmem(args[0].get_data())))
-        sys.stdout.write("%c" % op1)
+        self.__write(chr(int(self.__registers[args[0][1]])))
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.LOAD)
     def __ins_load(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
-        self.__amem.setmem(op1.get_data(), op2_val)
+        op1, op2 = args
+        self.__registers[op1[1]] = PVM.__extract_value(op2, self.__registers)
         self.__next_instruction()
 
+    # go is a call, the program resolved every go that is used as a
+    # plain jump to FUSED_ID.JUMP
+    @OpcodeTable.handles(INSTRUCTION_ID.GO)
     def __ins_go(self, args):
-        op1 = args[0].get_data()
-        self.__store_instruction()
-        self.__change_instruction_address(op1)
-        self.__execute__address(op1)
+        if self.stack_pointer == len(self.call_stack):
+            raise PlasStackError.overflow(self.__insmem.i_line(self.instruction_pointer), len(self.call_stack))
+        self.call_stack[self.stack_pointer] = self.instruction_pointer
+        self.stack_pointer += 1
+        self.__change_instruction_address(args[0][1])
 
+    @OpcodeTable.handles(INSTRUCTION_ID.EXIT)
     def __ins_exit(self, args):
-        op1 = PVM.__extract_value(args[0], self.__amem)
-        sys.exit(int(op1))
+        op1 = PVM.__extract_value(args[0], self.__registers)
+        self.exit_code = int(op1)
+        self.instruction_pointer = self.total_ins
 
+    @OpcodeTable.handles(INSTRUCTION_ID.EVAL)
     def __ins_eval(self, args):
-        op1 = PVM.__extract_value(args[0], self.__amem)
-        op2 = PVM.__extract_value(args[1], self.__amem)
-        self.__adjust_flags_evalop(op1, op2)
+        op1 = PVM.__extract_value(args[0], self.__registers)
+        op2 = PVM.__extract_value(args[1], self.__registers)
+        self.__fmem.compare(op1, op2)
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFEQ)
     def __ins_ifeq(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FEQ]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FEQ_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFNE)
     def __ins_ifne(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FNE]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FNE_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFGT)
     def __ins_ifgt(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FGT]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FGT_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFLT)
     def __ins_iflt(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FLT]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FLT_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFGE)
     def __ins_ifge(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FGE]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FGE_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IFLE)
     def __ins_ifle(self, args):
-        op1 = args[0].get_data()
-        if self.__fmem.get_flag(FMT.flags[FMT.FLE]):
-            self.__change_instruction_address(op1)
-            self.__execute__address(op1)
+        if self.__fmem.state & FMT.FLE_MASK:
+            self.__change_instruction_address(args[0][1])
             return
         self.__next_instruction()
-        # self.__start_execution(self.instruction_pointer + 1)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.ADD)
     def __ins_add(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
-        res = ALOperation.add(self.__amem.getmem(op1.get_data()), op2_val)
-        self.__amem.setmem(op1.get_data(), res)
+        op1, op2 = args
+        registers = self.__registers
+        registers[op1[1]] = ALOperation.add(registers[op1[1]], PVM.__extract_value(op2, registers))
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.SUB)
     def __ins_sub(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
-        res = ALOperation.sub(self.__amem.getmem(op1.get_data()), op2_val)
-        self.__amem.setmem(op1.get_data(), res)
+        op1, op2 = args
+        registers = self.__registers
+        registers[op1[1]] = ALOperation.sub(registers[op1[1]], PVM.__extract_value(op2, registers))
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.MUL)
     def __ins_mul(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
-        res = ALOperation.mul(self.__amem.getmem(op1.get_data()), op2_val)
-        self.__amem.setmem(op1.get_data(), res)
+        op1, op2 = args
+        registers = self.__registers
+        registers[op1[1]] = ALOperation.mul(registers[op1[1]], PVM.__extract_value(op2, registers))
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.IDIV)
     def __ins_idiv(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
+        op1, op2 = args
+        registers = self.__registers
+        op2_val = PVM.__extract_value(op2, registers)
         if op2_val == 0:
-            Log.e("runtime error", "zero division error")
-            Log.e("reason", "division by zero at line " + str(list(self.__raw_instruction.values()[1])))
-            sys.exit(SysExit.EXIT_ZERO_DIVISION_ERROR)
+            self.__zero_division()
 
-        res = ALOperation.idiv(self.__amem.getmem(op1.get_data()), op2_val)
-        self.__amem.setmem(op1.get_data(), res)
+        registers[op1[1]] = ALOperation.idiv(registers[op1[1]], op2_val)
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.DIV)
     def __ins_div(self, args):
-        op1, op2 = args[0:2]
-        op2_val = PVM.__extract_value(op2, self.__amem)
+        op1, op2 = args
+        registers = self.__registers
+        op2_val = PVM.__extract_value(op2, registers)
         if op2_val == 0:
-            Log.e("runtime error", "zero division error")
-            Log.e("reason", "division by zero at line " + \
-                  str(list(self.__raw_instruction.values())[self.instruction_pointer][1]))
-
-            sys.exit(SysExit.EXIT_ZERO_DIVISION_ERROR)
+            self.__zero_division()
 
-        res = ALOperation.div(self.__amem.getmem(op1.get_data()), op2_val)
-        self.__amem.setmem(op1.get_data(), res)
+        registers[op1[1]] = ALOperation.div(registers[op1[1]], op2_val)
         self.__next_instruction()
 
+    @OpcodeTable.handles(INSTRUCTION_ID.HOME)
     def __ins_home(self, args=None):
-        self.__change_instruction_address(self.temporary_address + 0x01)
-        self.__start_execution(self.instruction_pointer)
+        if not self.stack_pointer:
+            raise PlasStackError.underflow(self.__insmem.i_line(self.instruction_pointer))
+        self.stack_pointer -= 1
+        self.__change_instruction_address(self.call_stack[self.stack_pointer] + 0x01)
 
+    @OpcodeTable.handles(INSTRUCTION_ID.LOG)
     def __ins_log(self, args):
         op1 = args[0]
-        sys.stdout.write("%s\n" % self.__amem.getmem(op1.get_data()))
+        self.__write("%s\n" % self.__registers[op1[1]])
         self.__next_instruction()
 
-    def __init_instruction_memory(self):
-        for (address, ins_wlan) in self.__raw_instruction.items():
-            ins_arg = []
-            for expression in ins_wlan[0]:
-                if expression.get_type() == TokenType.TKN_INS:
-                    ins_arg.append(InstructionTable.INS[expression.get_data()])
-                    continue
-                ins_arg.append(expression)
-            self.__insmem.i_set(address, ins_arg)
-
-    # after eval operation flag registers are adjust here
-    def __adjust_flags_evalop(self, op1, op2):
-        if op1 == op2:
-            self.__fmem.enable_flag(FMT.flags[FMT.FEQ])
-            self.__fmem.enable_flag(FMT.flags[FMT.FNE])
-            self.__fmem.disable_flag(FMT.flags[FMT.FGT])
-            self.__fmem.disable_flag(FMT.flags[FMT.FLT])
-            self.__fmem.enable_flag(FMT.flags[FMT.FGE])
-            self.__fmem.enable_flag(FMT.flags[FMT.FLE])
-        else:
-            self.__fmem.disable_flag(FMT.flags[FMT.FEQ])
-            self.__fmem.enable_flag(FMT.flags[FMT.FNE])
-            if op1 > op2:
-                self.__fmem.enable_flag(FMT.flags[FMT.FGT])
-                self.__fmem.disable_flag(FMT.flags[FMT.FLT])
-                if op1 >= op2:
-                    self.__fmem.disable_flag(FMT.flags[FMT.FLE])
-                    self.__fmem.disable_flag(FMT.flags[FMT.FGE])
-            else:
-                self.__fmem.disable_flag(FMT.flags[FMT.FGT])
-                self.__fmem.enable_flag(FMT.flags[FMT.FLT])
-                if op1 <= op2:
-                    self.__fmem.enable_flag(FMT.flags[FMT.FLE])
-                    self.__fmem.disable_flag(FMT.flags[FMT.FGE])
+    @OpcodeTable.handles(INSTRUCTION_ID.LOADW)
+    def __ins_loadw(self, args):
+        op1, op2 = args
+        self.__registers[op1[1]] = self.__words[self.__data_address(op2, self.__words)]
+        self.__next_instruction()
 
-    def __next_instruction(self):
-        self.instruction_pointer += 1
+    @OpcodeTable.handles(INSTRUCTION_ID.STOREW)
+    def __ins_storew(self, args):
+        self.__store_data(args, self.__words, DataSegment.WORD_MIN, DataSegment.WORD_MAX, "word")
 
-    def __change_instruction_address(self, address):
+    @OpcodeTable.handles(INSTRUCTION_ID.LOADB)
+    def __ins_loadb(self, args):
+        op1, op2 = args
+        self.__registers[op1[1]] = self.__bytes[self.__data_address(op2, self.__bytes)]
+        self.__next_instruction()
+
+    @OpcodeTable.handles(INSTRUCTION_ID.STOREB)
+    def __ins_storeb(self, args):
+        self.__store_data(args, self.__bytes, 0x00, 0xff, "byte")
+
+    @OpcodeTable.handles(FUSED_ID.EVAL_BRANCH)
+    def __ins_eval_branch(self, args):
+        op1, op2, mask, target, next_address = args
+        self.__fmem.compare(PVM.__extract_value(op1, self.__registers), PVM.__extract_value(op2, self.__registers))
+        if self.__fmem.state & mask:
+            self.__change_instruction_address(target)
+            return
+        self.__change_instruction_address(next_address)
+
+    @OpcodeTable.handles(FUSED_ID.LOAD_CONST)
+    def __ins_load_const(self, args):
+        op1, value, next_address = args
+        self.__registers[op1] = value
+        self.__change_instruction_address(next_address)
+
+    @OpcodeTable.handles(FUSED_ID.JUMP)
+    def __ins_jump(self, args):
+        self.__change_instruction_address(args[0][1])
+
+    def __ins_trace(self, trace):
+        address = trace(self.__registers, self.__fmem, self, self.__write)
+        if address < 0:
+            # a guard left at its own instruction, the plain handler runs
+            # it since that address can be the header of this very trace
+            self.instruction_pointer = ~address
+            operation, args = self.__interpreted[~address]
+            operation(args)
+            return
         self.instruction_pointer = address
 
-    def __store_instruction(self):
-        self.temporary_address = self.instruction_pointer
+    # word addresses index the words and byte addresses the bytes of the
+    # same memory, the address is checked before the value to store
+    def __data_address(self, operand, view) -> int:
+        address = PVM.__data_integer(PVM.__extract_value(operand, self.__registers))
+        if address is None or not 0 <= address < len(view):
+            raise PlasMemoryError.out_of_range(self.__insmem.i_line(self.instruction_pointer), len(self.data))
+        return address
+
+    def __store_data(self, args, view, low, high, unit):
+        address = self.__data_address(args[0], view)
+        value = PVM.__data_integer(PVM.__extract_value(args[1], self.__registers))
+        if value is None or not low <= value <= high:
+            raise PlasMemoryError.bad_value(self.__insmem.i_line(self.instruction_pointer), unit)
+        if not self.data.writable:
+            raise PlasMemoryError.read_only(self.__insmem.i_line(self.instruction_pointer))
+        view[address] = value
+        self.__next_instruction()
 
+    # a register value as a data address or data value. data memory
+    # holds integers, a float is truncated the way putc truncates it
+    # and inf and nan give None
     @staticmethod
-    def __is_float(num):
-        if re.fullmatch(r'-?([0-9]*)\.[0-9]*', num):
-            return True
-        return False
+    def __data_integer(value):
+        try:
+            return int(value)
+        except (OverflowError, ValueError):
+            return None
 
-    @staticmethod
-    def __extract_value(op, mem):
-        if op.get_type() == TokenType.TKN_VAL:
-            if PVM.__is_float(op.get_data()):
-                return float(op.get_data())
-            else:
-                return int(op.get_data())
+    def __zero_division(self):
+        raise PlasZeroDivisionError(self.__insmem.i_line(self.instruction_pointer))
 
-        if op.get_type() == TokenType.TKN_MEM:
-            address_value = mem.getmem(op.get_data())
-            if PVM.__is_float(str(address_value)):
-                return float(address_value)
-            else:
-                return int(address_value)
+    def __next_instruction(self):
+        self.instruction_pointer += 1
+
+    def __change_instruction_address(self, address):
+        self.instruction_pointer = address
+
+    @staticmethod
+    def __extract_value(op, registers):
+        if op[0] == TokenType.TKN_MEM:
+            return registers[op[1]]
+        return op[1]
 
 
 class MemoryAddressTable:
@@ -468,18 +770,25 @@ class MemoryAddressTable:
     }
 
 
+# register file indexed by the addresses in MemoryAddressTable
 class AbstractMemory:
     def __init__(self):
-        self.__memory = {}
         self.__memory_table = MemoryAddressTable.memory_addresses
-        for address in self.__memory_table.keys():
-            self.__memory[address] = 0
+        self.registers = [0] * len(self.__memory_table)
 
-    def setmem(self, address, value):
-        self.__memory[address] = value
+    def setmem(self, address: int, value):
+        self.registers[address] = value
+
+    def getmem(self, address: int):
+        return self.registers[address]
+
+    def dump(self) -> dict:
+        """ register values by name, for inspection """
+        return {name: self.registers[address] for (name, address) in self.__memory_table.items()}
 
-    def getmem(self, address):
-        return self.__memory[address]
+
+# every opcode has a handler, checked once at import
+OpcodeTable.check_handlers()
 
 
 # system exit types
@@ -487,92 +796,86 @@ class SysExit:
     EXIT_SUCCESS = 0
     EXIT_SYNTAX_ERROR = 9
     EXIT_ZERO_DIVISION_ERROR = 10
+    EXIT_BUDGET_EXCEEDED = 11
+    EXIT_STACK_ERROR = 12
+    EXIT_MEMORY_ERROR = 13
+
+
+# errors carry their exit status and the log lines that report them,
+# the command line logs them while embedding code gets them as values
+class PlasError(Exception):
+    def __init__(self, exit_code, messages):
+        super().__init__("; ".join(message for (_, message) in messages))
+        self.exit_code = exit_code
+        self.messages = messages
+
+    def log(self):
+        for (key, message) in self.messages:
+            if key is None:
+                Log.w(message)
+            else:
+                Log.e(key, message)
 
-class PLAS_SYNTAX:
-    SYNTAX_S = "putc     2        \n" + \
-               "load     2     2|3\n" + \
-               "go       6        \n" + \
-               "exit     2|3      \n" + \
-               "eval     2|3   2|3\n" + \
-               "ifeq     6        \n" + \
-               "ifne     6        \n" + \
-               "ifgt     6        \n" + \
-               "iflt     6        \n" + \
-               "ifge     6        \n" + \
-               "ifle     6        \n" + \
-               "add      2     2|3\n" + \
-               "sub      2     2|3\n" + \
-               "mul      2     2|3\n" + \
-               "idiv     2     2|3\n" + \
-               "div      2     2|3\n" + \
-               "home              \n" + \
-               "log      2        \n"
-
-
-class SyntaxBuilder:
-    __INSTRUCTION_INDEX = 0
-    __REQUIREMENT_INDEX = 1
-
-    def __init__(self, rules):
-        self.syntax_rules = rules
-        self.__preprocessor = Preprocessor(self.syntax_rules)
-        self.__preprocessed = self.__preprocessor.get_preprocessed()
-        self.__pre_rules = []
-        for syntax_tokens in self.__preprocessed:
-            self.__pre_rules.append(syntax_tokens[0])
-
-        # initialize syntax table
-        self.__rule_table = []
-        for rule in self.__pre_rules:
-            self.__rule_table.append(rule.split(" "))
-
-        self.rule_tree = {}
-        self.__add_rules()
-
-    def __add_rules(self):
-        for item in self.__rule_table:
-            instruction = item[SyntaxBuilder.__INSTRUCTION_INDEX]
-            requirements = item[SyntaxBuilder.__REQUIREMENT_INDEX:]
-            requirement_list = []
-            for requirement in requirements:
-                req = requirement.split("|")
-                options = []
-                for r in req:
-                    options.append(int(r))
-                requirement_list.append(options)
-            self.rule_tree[instruction] = requirement_list
 
-    def __str__(self):
-        string = ""
-        for (instruction, requirement) in self.rule_tree.items():
-            string += "[{0} [{1}]]\n".format(instruction, requirement)
-        return string
-
-    def get_rules(self):
-        return self.rule_tree
-
-
-class SyntaxMatcher:
-    def __init__(self, syntax_rule, syntax):
-        self.syntax_rule = syntax_rule
-        self.syntax = syntax
-        self.checked = 0
-
-    def matches(self):
-        for rule in self.syntax_rule:
-            matched = False
-            for option in rule:
-                if self.syntax[self.checked].get_type() == option:
-                    matched = True
-            if not matched:
-                return False
+class PlasSyntaxError(PlasError):
+    def __init__(self, messages):
+        super().__init__(SysExit.EXIT_SYNTAX_ERROR, messages)
 
-            self.checked += 1
 
-        return True
+class PlasRuntimeError(PlasError):
+    pass
+
+
+class PlasZeroDivisionError(PlasRuntimeError):
+    def __init__(self, line):
+        super().__init__(SysExit.EXIT_ZERO_DIVISION_ERROR, [
+            ("runtime error", "zero division error"),
+            ("reason", "division by zero at line " + str(line))
+        ])
 
-    def get_checked(self):
-        return self.checked
+
+class PlasBudgetError(PlasRuntimeError):
+    def __init__(self, line, reason):
+        super().__init__(SysExit.EXIT_BUDGET_EXCEEDED, [
+            ("runtime error", "budget exceeded"),
+            ("reason", "%s, stopped at line %s" % (reason, line))
+        ])
+
+
+class PlasStackError(PlasRuntimeError):
+    def __init__(self, line, error, reason):
+        super().__init__(SysExit.EXIT_STACK_ERROR, [
+            ("runtime error", error),
+            ("reason", "%s at line %s" % (reason, line))
+        ])
+
+    @staticmethod
+    def overflow(line, depth):
+        return PlasStackError(line, "call stack overflow", "more than %d nested calls" % depth)
+
+    @staticmethod
+    def underflow(line):
+        return PlasStackError(line, "call stack underflow", "home without a call to return to")
+
+
+class PlasMemoryError(PlasRuntimeError):
+    def __init__(self, line, error, reason):
+        super().__init__(SysExit.EXIT_MEMORY_ERROR, [
+            ("runtime error", error),
+            ("reason", "%s at line %s" % (reason, line))
+        ])
+
+    @staticmethod
+    def out_of_range(line, size):
+        return PlasMemoryError(line, "data address out of range", "outside the %d byte data segment" % size)
+
+    @staticmethod
+    def bad_value(line, unit):
+        return PlasMemoryError(line, "data value out of range", "value does not fit a %s" % unit)
+
+    @staticmethod
+    def read_only(line, writer="store"):
+        return PlasMemoryError(line, "read only data segment", "%s to a read only data segment" % writer)
 
 
 class LabelTable:
@@ -591,131 +894,193 @@ class LabelTable:
 
 
 class Parser:
+    # one forward pass over the lines. errors are still reported the way
+    # the earlier pass per check did: a label definition error stops at
+    # once, otherwise the first line not starting with an instruction,
+    # then the first bad label reference and then the first operand error
+    START = 0
+    REFERENCES = 1
+    OPERANDS = 2
+
     def __init__(self, tokens):
-        self.tokens = tokens
+        # tokens is a {line: tokens} table or an iterable of (line, tokens)
+        self.tokens = {}
+        self.data = {}  # data directives, numbered like the instructions
         self.labelTable = LabelTable()
-        self.rule_builder = SyntaxBuilder(PLAS_SYNTAX.SYNTAX_S)
-        self.rules = self.rule_builder.get_rules()
-        self.__address_table = {}
-        self.__evaluate_labels()
-        self.__check_starting_syntax()
-        self.__replace_labels()
-        self.__match_syntax()
-        self.__build_addresses()
-        self.__organize_address()
+        self.__label_addresses = {}  # label -> address of the line defining it
+        self.__references = []  # (line, label, token) patched once every label is known
+        self.__errors = [None, None, None]  # first error of each kind, by START, REFERENCES, OPERANDS
+        self.__parse(tokens.items() if isinstance(tokens, dict) else tokens)
+        self.__backpatch()
         # self.__log__labels()
 
     def get_raw_instructions(self):
         return self.tokens
 
-    # check for instructions at start
-    def __check_starting_syntax(self):
-        for (line, line_token) in self.tokens.items():
-            if not line_token[0].get_type() == TokenType.TKN_INS:
-                Log.e("error", "instruction is expected at line " + str(line))
-                Log.e("reason", "given is " + " [ " + line_token[0].get_data() + " ] not instruction")
-                sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-    def __match_syntax(self):
-        for (line, lineToken) in self.tokens.items():
-            instruction = lineToken[0].get_data()
-            expressions = lineToken[1:]
-            rule = self.rules[instruction]
-            syntax_matcher = SyntaxMatcher(rule, expressions)
-            if not len(lineToken[1:]) == len(rule):
-                Log.e("error", "expected argument not found at line " + str(line))
-                sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-            if not syntax_matcher.matches():
-                expected = "( "
-                for e in rule[syntax_matcher.get_checked() - 1]:
-                    expected += TTC.get_type(e) + " "
-                expected += " )"
-                found = expressions[syntax_matcher.get_checked()].get_data()
-                message = "expected {0} but found ( {1} ) at line {2}".format(expected, found, line)
-                Log.e("error", message)
-                sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-    def __evaluate_labels(self):
-        for (line, line_token) in self.tokens.items():
-            if Parser.__has_directive(line_token):
-                li = 0  # label index
-                for token in line_token:
-                    if token.get_type() == TokenType.TKN_SYM \
-                            and token.get_data() == ':':
-                        if li + 1 >= len(line_token):
-                            Log.e("error", "unable to locate label at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        if not line_token[li + 1].get_type() == TokenType.TKN_LBL:
-                            Log.e("error", "invalid label provided at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        if len(line_token) > li + 2:
-                            Log.e("error", "definition not allowed after label")
-                            Log.e("unacceptable definition", "error at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        if not self.labelTable.add(line_token[li + 1].get_data(), line):
-                            Log.e("error", "label cannot be redefined")
-                            Log.e("error", "label redefined at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        line_token = line_token[:li]
-                        self.tokens[line] = line_token
-
-                    li += 1
-
-    def __replace_labels(self):
-        for (line, line_token) in self.tokens.items():
-            if Parser.__has_directive(line_token):
-                li = 0
-                for token in line_token:
-                    if token.get_type() == TokenType.TKN_SYM \
-                            and token.get_data() == '@':
-                        if li + 1 >= len(line_token):
-                            Log.e("error", "unable to locate label at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        if not line_token[li + 1].get_type() == TokenType.TKN_LBL:
-                            Log.e("error", "invalid label provided at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        if len(line_token) > li + 2:
-                            Log.e("error", "syntax not allowed after label")
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        # check for label in label table
-                        label = line_token[li + 1].get_data()
-                        if label not in self.labelTable.get_table():
-                            Log.w("error label [ " + label + " ] could not be found")
-                            Log.e("error", "label not found at line " + str(line))
-                            sys.exit(SysExit.EXIT_SYNTAX_ERROR)
-
-                        line_token = line_token[:li + 1]
-                        token = Token.create_from(TokenType.TKN_ADR, self.labelTable.get_table()[label])
-                        line_token[li] = token
-                        self.tokens[line] = line_token
-                    li += 1
-
-    def __build_addresses(self):
-        start_ins = 0
-        for (line, instruction) in self.tokens.items():
-            self.__address_table[line] = start_ins
-            start_ins += 1
-
-    def __organize_address(self):
-        new_tokens = {}
-        for (line, each_instructions) in self.tokens.items():
-            new_tokens[self.__address_table[line]] = (each_instructions, line)
-
-        # address and instruction with origin line : ins_wline
-        for (address, ins_wline) in new_tokens.items():
-            for instruction in ins_wline[0]:
-                if instruction.get_type() == TokenType.TKN_ADR:
-                    instruction.set_data(self.__address_table[instruction.get_data()])
-
-        self.tokens = new_tokens
+    def get_raw_data(self):
+        return self.data
+
+    def get_labels(self) -> dict:
+        """ label -> line defining it """
+        return self.labelTable.get_table()
+
+    def __parse(self, tokens):
+        for (line, line_token) in tokens:
+            if line_token and line_token[0].get_type() == TokenType.TKN_INS \
+                    and OpcodeTable.BY_MNEMONIC[line_token[0].get_data()].directive:
+                self.__parse_data(line, line_token)
+                continue
+            address = len(self.tokens)
+            directive = Parser.__has_directive(line_token)
+            if directive:
+                line_token = self.__define_label(line, line_token, address)
+            self.tokens[address] = (line_token, line)
+            if self.__errors[Parser.START] is not None:
+                continue
+            if not self.__check_starting_syntax(line, line_token) or self.__errors[Parser.REFERENCES] is not None:
+                continue
+
+            if directive:
+                line_token = self.__reference_label(line, line_token)
+                if line_token is None:
+                    continue
+                self.tokens[address] = (line_token, line)
+            if self.__errors[Parser.OPERANDS] is None:
+                self.__match_syntax(line, line_token)
+
+    # a data line declares initial data memory instead of running and
+    # takes no address, so it can not hold a label. that is an error of
+    # the line itself, kept in order with the start errors
+    def __parse_data(self, line, line_token):
+        if Parser.__has_directive(line_token):
+            if self.__errors[Parser.START] is None:
+                self.__errors[Parser.START] = PlasSyntaxError([
+                    ("error", "label not allowed on data at line " + str(line))
+                ])
+            return
+        self.data[len(self.data)] = (line_token, line)
+        if all(error is None for error in self.__errors):
+            self.__match_syntax(line, line_token)
+
+    # errors that need every label are raised once the last line is read
+    def __backpatch(self):
+        if self.__errors[Parser.START] is not None:
+            raise self.__errors[Parser.START]
+
+        labels = self.labelTable.get_table()
+        reference_error = self.__errors[Parser.REFERENCES]
+        for (line, label, token) in self.__references:
+            if reference_error is not None and line > reference_error[0]:
+                break
+            if label not in labels:
+                raise PlasSyntaxError([
+                    (None, "error label [ " + label + " ] could not be found"),
+                    ("error", "label not found at line " + str(line))
+                ])
+        if reference_error is not None:
+            raise reference_error[1]
+
+        if self.__errors[Parser.OPERANDS] is not None:
+            raise self.__operand_error(*self.__errors[Parser.OPERANDS])
+
+        for (line, label, token) in self.__references:
+            token.set_data(self.__label_addresses[label])
+
+    # a line needs to start with an instruction
+    def __check_starting_syntax(self, line, line_token) -> bool:
+        if line_token and line_token[0].get_type() == TokenType.TKN_INS:
+            return True
+        given = line_token[0].get_data() if line_token else ":"
+        self.__errors[Parser.START] = PlasSyntaxError([
+            ("error", "instruction is expected at line " + str(line)),
+            ("reason", "given is " + " [ " + given + " ] not instruction")
+        ])
+        return False
+
+    # keeps the first operand mismatch, its message is made at the end
+    # since an address operand is reported by the line of its label
+    def __match_syntax(self, line, line_token):
+        opcode = OpcodeTable.BY_MNEMONIC[line_token[0].get_data()]
+        expressions = line_token[1:]
+        operands = opcode.operands
+        if opcode.directive and len(expressions) > len(operands):
+            operands += operands[-1:] * (len(expressions) - len(operands))
+        if not len(expressions) == len(operands):
+            self.__errors[Parser.OPERANDS] = (line, opcode, expressions, None)
+            return
+
+        for (checked, (token, mask)) in enumerate(zip(expressions, operands)):
+            if not mask >> token.get_type() & 1:
+                self.__errors[Parser.OPERANDS] = (line, opcode, expressions, checked)
+                return
+
+    def __operand_error(self, line, opcode, expressions, checked):
+        if checked is None:
+            return PlasSyntaxError([("error", "expected argument not found at line " + str(line))])
+
+        # the allowed types shown are the ones of the operand before it
+        expected = "( "
+        for e in opcode.types(min(checked - 1, len(opcode.operands) - 1)):
+            expected += TTC.get_type(e) + " "
+        expected += " )"
+        found = expressions[checked]
+        if found.get_type() == TokenType.TKN_ADR:
+            found = self.labelTable.get_table()[found.get_data()]
+        else:
+            found = found.get_data()
+        message = "expected {0} but found ( {1} ) at line {2}".format(expected, found, line)
+        return PlasSyntaxError([("error", message)])
+
+    # records a `: label` definition and returns the line without it
+    def __define_label(self, line, line_token, address):
+        for (li, token) in enumerate(line_token):
+            if not token.get_type() == TokenType.TKN_SYM or not token.get_data() == ':':
+                continue
+            if li + 1 >= len(line_token):
+                raise PlasSyntaxError([("error", "unable to locate label at line " + str(line))])
+
+            if not line_token[li + 1].get_type() == TokenType.TKN_LBL:
+                raise PlasSyntaxError([("error", "invalid label provided at line " + str(line))])
+
+            if len(line_token) > li + 2:
+                raise PlasSyntaxError([
+                    ("error", "definition not allowed after label"),
+                    ("unacceptable definition", "error at line " + str(line))
+                ])
+
+            label = line_token[li + 1].get_data()
+            if not self.labelTable.add(label, line):
+                raise PlasSyntaxError([
+                    ("error", "label cannot be redefined"),
+                    ("error", "label redefined at line " + str(line))
+                ])
+
+            self.__label_addresses[label] = address
+            return line_token[:li]
+        return line_token
+
+    # turns `@ label` into an address token holding the label until
+    # backpatching, None when the reference is malformed
+    def __reference_label(self, line, line_token):
+        for (li, token) in enumerate(line_token):
+            if not token.get_type() == TokenType.TKN_SYM or not token.get_data() == '@':
+                continue
+            error = None
+            if li + 1 >= len(line_token):
+                error = PlasSyntaxError([("error", "unable to locate label at line " + str(line))])
+            elif not line_token[li + 1].get_type() == TokenType.TKN_LBL:
+                error = PlasSyntaxError([("error", "invalid label provided at line " + str(line))])
+            elif len(line_token) > li + 2:
+                error = PlasSyntaxError([("error", "syntax not allowed after label")])
+            if error is not None:
+                self.__errors[Parser.REFERENCES] = (line, error)
+                return None
+
+            label = line_token[li + 1].get_data()
+            address = Token.create_from(TokenType.TKN_ADR, label)
+            self.__references.append((line, label, address))
+            return line_token[:li] + [address]
+        return line_token
 
     @staticmethod
     def __has_directive(line):
@@ -752,35 +1117,2433 @@ class Parser:
             f.write(data)
 
 
+# a compiled plas program. operands are decoded once here and the
+# same program can be run any number of times on fresh vm state
+class Program:
+    DATA_OPCODES = (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.STOREW, INSTRUCTION_ID.LOADB, INSTRUCTION_ID.STOREB)
+
+    def __init__(self, raw_instruction, name="<program>", labels=None, raw_data=None):
+        self.name = name
+        self.labels = labels if labels is not None else {}  # label -> source line
+        self.memory = InstructionMemory()
+        for address in range(len(raw_instruction)):
+            tokens, line = raw_instruction[address]
+            opcode = InstructionTable.INS[tokens[0].get_data()]
+            args = tuple(Program.__decode_operand(token) for token in tokens[1:])
+            self.memory.i_set(address, (opcode, args), line)
+        self.__resolve_calls()
+        # (first word, word values, line) of every data directive
+        self.data = tuple(Program.__decode_data(*raw_data[number]) for number in range(len(raw_data or {})))
+
+    def __len__(self):
+        return len(self.memory)
+
+    def digest(self) -> str:
+        """ hash of the compiled instructions and data, it changes when the optimizer rewrites them """
+        instructions = tuple(self.memory.i_at(address) for address in range(len(self.memory)))
+        # repr is canonical where marshal output depends on object sharing
+        return hashlib.sha256(repr((instructions, self.data)).encode("utf-8")).hexdigest()
+
+    def data_size(self) -> int:
+        """ bytes of data memory a run gets, enough for every data directive
+        and no memory at all for a program without data """
+        if not self.data and not any(self.memory.i_at(address)[0] in Program.DATA_OPCODES
+                                     for address in range(len(self.memory))):
+            return 0
+        end = max([word + len(values) for (word, values, _) in self.data], default=0)
+        return max(DataSegment.DEFAULT_SIZE, end * DataSegment.WORD_SIZE)
+
+    def optimize(self, level=1, zero_registers=True) -> dict:
+        """ runs the optimizer passes in place and returns their report.
+        level 1 fuses instructions, level 2 also runs the dataflow passes
+        which assume registers start at 0 unless zero_registers is False """
+        report = {}
+        if level >= 2:
+            report.update(DataflowOptimizer(self, zero_registers).optimize())
+        if level >= 1:
+            report.update(PeepholeOptimizer(self).optimize())
+        # removed code can leave a call right before a home
+        self.__resolve_tail_calls()
+        return report
+
+    @staticmethod
+    def from_source(source: str, name="<source>", stats=None):
+        """ compiles source text, raises PlasSyntaxError. a PipelineStats
+        given as stats gets every phase """
+        parser = Program.__parse(source.split("\n"), stats)
+        return Program.__decode(parser.get_raw_instructions(), name, parser.get_labels(), parser.get_raw_data(), stats)
+
+    @staticmethod
+    def from_file(file: str, cache=True, cache_dir=None, token_out=False, stats=None):
+        """ compiles a source file through the .plasc cache, raises PlasSyntaxError.
+        a PipelineStats given as stats gets every phase """
+        ss = SourceStream(file)
+        program_cache = None
+        cached = None
+        if cache:
+            program_cache = ProgramCache(file, PLAS_VERSION, cache_dir)
+            with PipelineStats.measure(stats, "cache") as record:
+                cached = program_cache.load()
+                record["hit"] = cached is not None
+
+        if cached is not None:
+            raw_instruction, labels, raw_data = cached
+        else:
+            if token_out:
+                with PipelineStats.measure(stats, "tokenize"):
+                    preprocessor = Preprocessor(ss.get_stream())
+                    tokenizer = Tokenizer(preprocessor.get_preprocessed())
+                    tokenizer.to_file(file+".tkn")
+                with PipelineStats.measure(stats, "parse"):
+                    parser = Parser(tokenizer.get_tokens())
+            else:
+                parser = Program.__parse(ss.lines(), stats)
+            raw_instruction, labels, raw_data = parser.get_raw_instructions(), parser.get_labels(), parser.get_raw_data()
+            if program_cache is not None:
+                program_cache.store(raw_instruction, labels, raw_data)
+
+        return Program.__decode(raw_instruction, file, labels, raw_data, stats)
+
+    def run(self, output=None, jit=False, profile=None, trace=None, stats=None, data=None) -> "RunResult":
+        """ runs on a fresh vm. output defaults to an in memory buffer
+        returned with the result, errors are returned instead of raised.
+        jit compiles hot loops to python while running, a Profile given
+        as profile or an ExecutionTrace given as trace is filled in instead.
+        a PipelineStats given as stats gets the run phase. a DataSegment
+        given as data is the data memory, by default the run gets its own """
+        sink = None
+        if output is None:
+            sink = BytesSink()
+            output = OutputChannel(sink, policy=FlushPolicy.EXIT)
+
+        try:
+            exit_code = self.execute(output, jit, profile, trace, stats, data)
+        except PlasRuntimeError as error:
+            return RunResult(error.exit_code, sink.getvalue() if sink else None, error)
+        return RunResult(exit_code, sink.getvalue() if sink else None)
+
+    def execute(self, output=None, jit=False, profile=None, trace=None, stats=None, data=None) -> int:
+        """ runs on a fresh vm and returns the exit code, runtime errors are raised """
+        with PipelineStats.measure(stats, "run") as record:
+            vm = PVM(self, output, jit, profile, trace, stats is not None, data=data)
+            try:
+                return vm.run()
+            finally:
+                record["executed"] = vm.executed
+
+    # with stats every phase runs to completion on its own so it can be
+    # measured, otherwise source lines flow through preprocessing and
+    # tokenizing one at a time and only the parser keeps the program
+    @staticmethod
+    def __parse(lines, stats):
+        if stats is None:
+            return Parser(Tokenizer.stream(Preprocessor.stream(lines)))
+        with stats.phase("preprocess") as record:
+            preprocessed = list(Preprocessor.stream(lines))
+            record["lines"] = len(preprocessed)
+        with stats.phase("tokenize") as record:
+            tokens = list(Tokenizer.stream(preprocessed))
+            record["tokens"] = sum(len(line_tokens) for (_, line_tokens) in tokens)
+        with stats.phase("parse") as record:
+            parser = Parser(tokens)
+            record["instructions"] = len(parser.get_raw_instructions())
+        return parser
+
+    @staticmethod
+    def __decode(raw_instruction, name, labels, raw_data, stats):
+        with PipelineStats.measure(stats, "compile") as record:
+            program = Program(raw_instruction, name, labels, raw_data)
+            record["instructions"] = len(program)
+        return program
+
+    async def run_async(self, output=None, jit=False, yield_every=1000) -> "RunResult":
+        """ run on an event loop, handing control back every yield_every
+        instructions. cancel the task or wrap it in asyncio.wait_for to
+        stop it, a timeout is raised the usual asyncio way """
+        sink = None
+        if output is None:
+            sink = BytesSink()
+            output = OutputChannel(sink, policy=FlushPolicy.EXIT)
+
+        try:
+            exit_code = await PVM(self, output, jit).run_async(yield_every)
+        except PlasRuntimeError as error:
+            return RunResult(error.exit_code, sink.getvalue() if sink else None, error)
+        return RunResult(exit_code, sink.getvalue() if sink else None)
+
+    def run_lanes(self, registers, lanes=None) -> "LaneResult":
+        """ runs the program once per lane on a LaneEngine, registers maps
+        a register to its start value in every lane. needs numpy """
+        return LaneEngine(self).run(registers, lanes)
+
+    # go is both the call of a subroutine ending in home and the plain
+    # jump of loops and forward skips, and only a call pushes a return
+    # address. a go is a call when its target can reach a home, where a
+    # call already known is followed to its return address, and it is
+    # not the back edge of a loop, one whose target leads back to it.
+    # such a go is still a recursive call when its target is the entry
+    # of a subroutine, one a go outside the cycle goes to as well.
+    # a go right before a home is a tail call, the callee returns for
+    # its caller. everything else is rewritten to FUSED_ID.JUMP
+    def __resolve_calls(self):
+        size = len(self.memory)
+        code = [self.memory.i_at(address) for address in range(size)]
+        homes = [address for address in range(size) if code[address][0] == INSTRUCTION_ID.HOME]
+        calls = set()
+        if homes:
+            calls = {address for address in range(size) if code[address][0] == INSTRUCTION_ID.GO
+                     and not (address + 1 < size and code[address + 1][0] == INSTRUCTION_ID.HOME)}
+        entries = {}  # target -> the gos going to it
+        for address in range(size):
+            if code[address][0] == INSTRUCTION_ID.GO:
+                entries.setdefault(code[address][1][0][1], []).append(address)
+
+        while calls:
+            predecessors = [[] for _ in range(size)]
+            for address in range(size):
+                for successor in Program.__successors(code, address, calls):
+                    if successor < size:
+                        predecessors[successor].append(address)
+            returning = Program.__closure(homes, predecessors.__getitem__)
+            resolved = set()
+            for address in calls:
+                target = code[address][1][0][1]
+                if target not in returning:
+                    continue
+                cycle = Program.__closure(
+                    [target], lambda at: [s for s in Program.__successors(code, at, calls) if s < size])
+                if address in cycle and all(entry in cycle for entry in entries[target]):
+                    continue
+                resolved.add(address)
+            if resolved == calls:
+                break
+            calls = resolved
+
+        for address in range(size):
+            opcode, args = code[address]
+            if opcode == INSTRUCTION_ID.GO and address not in calls:
+                self.memory.i_set(address, (FUSED_ID.JUMP, args), self.memory.i_line(address))
+
+    def __resolve_tail_calls(self):
+        for address in range(len(self.memory) - 1):
+            opcode, args = self.memory.i_at(address)
+            if opcode == INSTRUCTION_ID.GO and self.memory.i_at(address + 1)[0] == INSTRUCTION_ID.HOME:
+                self.memory.i_set(address, (FUSED_ID.JUMP, args), self.memory.i_line(address))
+
+    # addresses an instruction continues at, a call continues after its return
+    @staticmethod
+    def __successors(code, address, calls):
+        opcode, args = code[address]
+        if opcode == INSTRUCTION_ID.GO:
+            return (address + 1,) if address in calls else (args[0][1],)
+        if opcode == FUSED_ID.JUMP:
+            return (args[0][1],)
+        if opcode in OpcodeTable.BRANCH_MASKS:
+            return args[0][1], address + 1
+        if opcode == FUSED_ID.EVAL_BRANCH:
+            return args[3], args[4]
+        if opcode == FUSED_ID.LOAD_CONST:
+            return (args[2],)
+        if opcode in (INSTRUCTION_ID.EXIT, INSTRUCTION_ID.HOME):
+            return ()
+        return (address + 1,)
+
+    @staticmethod
+    def __closure(start, following) -> set:
+        seen = set(start)
+        pending = list(start)
+        while pending:
+            for address in following(pending.pop()):
+                if address not in seen:
+                    seen.add(address)
+                    pending.append(address)
+        return seen
+
+    # operands are resolved once into (type, data) pairs: registers
+    # become indices into the register file, values become numbers
+    # and addresses stay as resolved instruction addresses
+    @staticmethod
+    def __decode_operand(token):
+        token_type = token.get_type()
+        if token_type == TokenType.TKN_MEM:
+            return token_type, MemoryAddressTable.memory_addresses[token.get_data()]
+        if token_type == TokenType.TKN_VAL:
+            if Program.__is_float(token.get_data()):
+                return token_type, float(token.get_data())
+            return token_type, int(token.get_data())
+        return token_type, token.get_data()
+
+    # data memory holds words, a float value is truncated like a store does
+    @staticmethod
+    def __decode_data(tokens, line):
+        word, *values = (Program.__decode_operand(token)[1] for token in tokens[1:])
+        if not isinstance(word, int) or word < 0:
+            raise PlasSyntaxError([("error", "data needs a word address of 0 or more at line " + str(line))])
+        values = tuple(int(value) for value in values)
+        if not all(DataSegment.WORD_MIN <= value <= DataSegment.WORD_MAX for value in values):
+            raise PlasSyntaxError([("error", "data value does not fit a word at line " + str(line))])
+        return word, values, line
+
+    @staticmethod
+    def __is_float(num):
+        if re.fullmatch(r'-?([0-9]*)\.[0-9]*', num):
+            return True
+        return False
+
+
+# outcome of a single program run
+class RunResult:
+    def __init__(self, exit_code, output=None, error=None):
+        self.exit_code = exit_code
+        self.output = output  # captured bytes, None when an output channel was given
+        self.error = error  # PlasError of a failed run
+
+    def __repr__(self):
+        return "RunResult(exit_code={0}, output={1!r}, error={2!r})".format(self.exit_code, self.output, self.error)
+
+
+# the state of a vm between two instructions: registers, comparison
+# state, instruction pointer and calls in progress, tied to the program it was taken from. any
+# number of vms can be forked from one snapshot to skip running the
+# same setup again, and it serializes for another process holding
+# the same compiled program
+class VMSnapshot:
+    MAGIC = b"PLASS\x00"
+
+    def __init__(self, program, registers, state, instruction_pointer, calls=(), exit_code=0, data=None):
+        self.program = program
+        self.registers = registers  # register values by index
+        self.state = state  # FlagMemory comparison state
+        self.instruction_pointer = instruction_pointer
+        self.calls = calls  # addresses of the go of every call in progress, outermost first
+        self.exit_code = exit_code
+        self.data = data  # data memory bytes, None leaves the data of the vm as it is
+
+    def digest(self) -> str:
+        return self.program.digest()
+
+    def fork(self, output=None, jit=False) -> PVM:
+        """ a new vm on the program, ready to continue from this snapshot """
+        vm = PVM(self.program, output, jit)
+        vm.restore(self)
+        return vm
+
+    def to_bytes(self) -> bytes:
+        return VMSnapshot.MAGIC + marshal.dumps((
+            PLAS_VERSION, self.program.digest(), self.registers, self.state,
+            self.instruction_pointer, self.calls, self.exit_code, self.data))
+
+    @staticmethod
+    def from_bytes(data: bytes, program) -> "VMSnapshot":
+        """ a snapshot serialized by to_bytes, program must be compiled and
+        optimized the same way as the one it was taken from """
+        if not data.startswith(VMSnapshot.MAGIC):
+            raise ValueError("not a plas vm snapshot")
+        try:
+            payload = marshal.loads(data[len(VMSnapshot.MAGIC):])
+        except (EOFError, ValueError, TypeError):
+            raise ValueError("corrupt plas vm snapshot")
+        if not isinstance(payload, tuple) or not payload:
+            raise ValueError("corrupt plas vm snapshot")
+        # checked before unpacking, older versions have another layout
+        if not payload[0] == PLAS_VERSION:
+            raise ValueError("snapshot of plas %s, this is plas %s" % (payload[0], PLAS_VERSION))
+        try:
+            version, digest, registers, state, pointer, calls, exit_code, data = payload
+        except ValueError:
+            raise ValueError("corrupt plas vm snapshot")
+        if not digest == program.digest():
+            raise ValueError("snapshot does not belong to %s" % program.name)
+        return VMSnapshot(program, registers, state, pointer, calls, exit_code, data)
+
+
+# execution counts and time per instruction address, filled in by a vm
+# running with it and summed up per source line and per label region.
+# a label region runs from the line of its label to the next label
+class Profile:
+    ENTRY = "(entry)"  # region of the instructions before the first label
+
+    def __init__(self, program):
+        self.program = program
+        self.counts = [0] * len(program.memory)
+        self.times = [0] * len(program.memory)  # nanoseconds
+        self.seconds = 0.0  # wall time of the profiled run
+        labels = sorted((line, label) for (label, line) in program.labels.items())
+        self.__label_lines = [line for (line, _) in labels]
+        self.__label_names = [label for (_, label) in labels]
+
+    def label_at(self, line) -> str:
+        """ the label whose region holds a source line """
+        index = bisect.bisect_right(self.__label_lines, line) - 1
+        return self.__label_names[index] if index >= 0 else Profile.ENTRY
+
+    def by_address(self) -> list:
+        rows = []
+        memory = self.program.memory
+        for address in range(len(memory)):
+            opcode = OpcodeTable.BY_ID[memory.i_at(address)[0]]
+            line = memory.i_line(address)
+            rows.append({
+                "address": address,
+                "line": line,
+                "label": self.label_at(line),
+                "instruction": opcode.mnemonic or "fused 0x%x" % opcode.id,
+                "count": self.counts[address],
+                "seconds": self.times[address] / 1e9
+            })
+        return Profile.__hottest(rows)
+
+    def by_line(self) -> list:
+        return Profile.__hottest(self.__group("line"))
+
+    def by_label(self) -> list:
+        return Profile.__hottest(self.__group("label"))
+
+    def to_dict(self) -> dict:
+        return {
+            "program": self.program.name,
+            "instructions": sum(self.counts),
+            "seconds": self.seconds,
+            "labels": self.by_label(),
+            "lines": self.by_line(),
+            "addresses": self.by_address()
+        }
+
+    def write_json(self, file):
+        with open(file, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def hot_spots(self, limit=10) -> str:
+        """ the hottest labels and lines as a text table """
+        total = sum(self.times) or 1
+        text = "profile: %s, %d instructions in %.6fs\n" % (self.program.name, sum(self.counts), self.seconds)
+        for (key, rows) in (("label", self.by_label()), ("line", self.by_line())):
+            text += "\n%-20s %12s %12s %7s\n" % (key, "count", "seconds", "time")
+            for row in [row for row in rows if row["count"]][:limit]:
+                text += "%-20s %12d %12.6f %6.1f%%\n" % (
+                    row[key], row["count"], row["seconds"], row["seconds"] * 1e9 * 100 / total)
+        return text
+
+    def __group(self, key) -> list:
+        groups = {}
+        for row in self.by_address():
+            group = groups.setdefault(row[key], {key: row[key], "count": 0, "seconds": 0.0})
+            group["count"] += row["count"]
+            group["seconds"] += row["seconds"]
+        return list(groups.values())
+
+    @staticmethod
+    def __hottest(rows) -> list:
+        return sorted(rows, key=lambda row: (-row["seconds"], -row["count"]))
+
+
+# the last instructions run by a vm, for looking back at how a failed
+# run got where it did. every step overwrites one slot of preallocated
+# lists so recording allocates nothing, the deltas are read back from
+# the instruction at each address when the trace is dumped
+class ExecutionTrace:
+    DEFAULT_SIZE = 64
+    WRITES_REGISTER = (INSTRUCTION_ID.LOAD, INSTRUCTION_ID.ADD, INSTRUCTION_ID.SUB,
+                       INSTRUCTION_ID.MUL, INSTRUCTION_ID.IDIV, INSTRUCTION_ID.DIV,
+                       INSTRUCTION_ID.LOADW, INSTRUCTION_ID.LOADB)
+    STATES = {FMT.CMP_NONE: "none", FMT.CMP_LT: "lt", FMT.CMP_EQ: "eq", FMT.CMP_GT: "gt"}
+
+    def __init__(self, program, size=DEFAULT_SIZE):
+        if size < 1:
+            raise ValueError("trace size must be at least 1")
+        self.program = program
+        self.size = size
+        self.addresses = [0] * size
+        self.values = [0] * size  # destination register after the instruction
+        self.states = [0] * size  # comparison state after the instruction
+        self.depths = [0] * size  # calls in progress after the instruction
+        self.position = 0  # instructions recorded so far, the next slot is position % size
+        self.failed = None  # address of the instruction that raised
+        # register each address writes, 0 for instructions writing none
+        self.destinations = [ExecutionTrace.__destination(program.memory.i_at(address))
+                             for address in range(len(program.memory))]
+
+    def entries(self) -> list:
+        """ the recorded instructions oldest first, the one that raised last """
+        memory = self.program.memory
+        rows = []
+        for position in range(max(0, self.position - self.size), self.position):
+            slot = position % self.size
+            address = self.addresses[slot]
+            rows.append({
+                "address": address,
+                "line": memory.i_line(address),
+                "instruction": ExecutionTrace.__format(memory.i_at(address)),
+                "delta": self.__delta(address, slot)
+            })
+        if self.failed is not None:
+            rows.append({
+                "address": self.failed,
+                "line": memory.i_line(self.failed),
+                "instruction": ExecutionTrace.__format(memory.i_at(self.failed)),
+                "delta": "failed"
+            })
+        return rows
+
+    def dump(self) -> str:
+        """ the entries as text, with the source line of each when the source file can be read """
+        source = self.__source_lines()
+        rows = self.entries()
+        text = "trace: last %d of %d instructions run by %s\n" % (
+            len(rows), self.position + (self.failed is not None), self.program.name)
+        for row in rows:
+            line = row["line"]
+            code = source[line - 1].strip() if 0 < line <= len(source) else ""
+            text += "0x%04x %5d  %-24s %-16s %s\n" % (row["address"], line, row["instruction"], row["delta"], code)
+        return text
+
+    def __delta(self, address, slot) -> str:
+        opcode = self.program.memory.i_at(address)[0]
+        if opcode in ExecutionTrace.WRITES_REGISTER or opcode == FUSED_ID.LOAD_CONST:
+            return "$%x = %s" % (self.destinations[address], self.values[slot])
+        if opcode == INSTRUCTION_ID.EVAL or opcode == FUSED_ID.EVAL_BRANCH:
+            return "cmp = " + ExecutionTrace.STATES[self.states[slot]]
+        if opcode in (INSTRUCTION_ID.GO, INSTRUCTION_ID.HOME):
+            return "depth = %d" % self.depths[slot]
+        return ""
+
+    @staticmethod
+    def __destination(instruction) -> int:
+        opcode, args = instruction
+        if opcode in ExecutionTrace.WRITES_REGISTER:
+            return args[0][1]
+        if opcode == FUSED_ID.LOAD_CONST:
+            return args[0]
+        return 0
+
+    @staticmethod
+    def __format(instruction) -> str:
+        opcode, args = instruction
+        mnemonic = OpcodeTable.BY_ID[opcode].mnemonic
+        if opcode == FUSED_ID.JUMP:
+            return "jump 0x%x" % args[0][1]
+        if mnemonic is None:
+            return "fused 0x%x" % opcode
+        operands = []
+        for (token_type, data) in args:
+            if token_type == TokenType.TKN_MEM:
+                operands.append("$%x" % data)
+            elif token_type == TokenType.TKN_ADR:
+                operands.append("0x%x" % data)
+            else:
+                operands.append(str(data))
+        return " ".join([mnemonic] + operands)
+
+    def __source_lines(self) -> list:
+        try:
+            with open(self.program.name) as f:
+                return f.read().split("\n")
+        except (OSError, UnicodeDecodeError):
+            return []
+
+
+# wall time of every pipeline phase with the counts it produced, and
+# optionally the peak memory it allocated. tracemalloc slows every
+# allocation down, so memory is only traced when asked for. hook is
+# called with each finished phase, for feeding a metrics collector
+class PipelineStats:
+    def __init__(self, name="<program>", memory=False, hook=None):
+        self.name = name
+        self.memory = memory
+        self.hook = hook
+        self.phases = []  # finished phase records in the order they ran
+
+    @staticmethod
+    def measure(stats, phase):
+        """ stats.phase(phase), or a context recording nothing when stats is None """
+        if stats is None:
+            return contextlib.nullcontext({})
+        return stats.phase(phase)
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """ times the block, which can add its counts to the yielded record """
+        record = {"phase": phase, "seconds": 0.0}
+        started_tracing = False
+        if self.memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.memory:
+                record["peak_bytes"] = tracemalloc.get_traced_memory()[1] - base
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append(record)
+            if self.hook is not None:
+                self.hook(record)
+
+    def to_dict(self) -> dict:
+        return {
+            "program": self.name,
+            "seconds": sum(record["seconds"] for record in self.phases),
+            "phases": self.phases
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_text(self) -> str:
+        text = "stats: %s, %.6fs\n" % (self.name, self.to_dict()["seconds"])
+        for record in self.phases:
+            counts = ", ".join("%s %s" % (key, value) for (key, value) in record.items()
+                               if key not in ("phase", "seconds", "peak_bytes"))
+            peak = "%10.1f KiB" % (record["peak_bytes"] / 1024) if "peak_bytes" in record else ""
+            text += "%-12s %10.6fs %s  %s\n" % (record["phase"], record["seconds"], peak, counts)
+        return text
+
+
+# value lattice element for a register or the comparison state that
+# is not the same constant on every path reaching an instruction
+class NotConstant:
+    def __repr__(self):
+        return "NAC"
+
+
+# optimizer pass over a control flow graph built from the resolved
+# jump targets. it propagates constants through the 16 registers and
+# the comparison state, folds arithmetic and decided branches, drops
+# dead stores and unreachable instructions and hoists constant loads
+# out of loops. addresses are rebuilt at the end, every instruction
+# keeps its source line
+class DataflowOptimizer:
+    NAC = NotConstant()
+    CMP = len(MemoryAddressTable.memory_addresses)  # comparison state slot after the registers
+    CMP_BIT = 1 << CMP
+
+    ARITHMETIC = {
+        INSTRUCTION_ID.ADD: ALOperation.add,
+        INSTRUCTION_ID.SUB: ALOperation.sub,
+        INSTRUCTION_ID.MUL: ALOperation.mul,
+        INSTRUCTION_ID.IDIV: ALOperation.idiv,
+        INSTRUCTION_ID.DIV: ALOperation.div
+    }
+    DIVISIONS = (INSTRUCTION_ID.IDIV, INSTRUCTION_ID.DIV)
+    DATA_LOADS = (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.LOADB)  # data memory is not tracked, loads give NAC
+    SOURCE_OPCODES = set(InstructionTable.INS.values()) | {FUSED_ID.JUMP}  # go resolves to a jump
+
+    def __init__(self, program, zero_registers=True):
+        self.program = program
+        self.memory = program.memory
+        self.size = len(self.memory)
+        # the vm starts with every register at 0 and nothing evaluated,
+        # callers that preload registers must not rely on that
+        self.zero_registers = zero_registers
+        self.code = [list(self.memory.i_at(address)) for address in range(self.size)]
+        self.lines = [self.memory.i_line(address) for address in range(self.size)]
+        self.report = {
+            "instructions_before": self.size,
+            "instructions_after": self.size,
+            "constants_folded": 0,
+            "branches_folded": 0,
+            "dead_stores": 0,
+            "unreachable": 0,
+            "hoisted": 0
+        }
+
+    def optimize(self) -> dict:
+        if not self.size or any(ins[0] not in DataflowOptimizer.SOURCE_OPCODES for ins in self.code):
+            return self.report  # already optimized or empty
+
+        self.__returns = [address + 1 for address in range(self.size)
+                          if self.code[address][0] == INSTRUCTION_ID.GO]
+        states = self.__propagate_constants()
+        self.__fold_constants(states)
+        self.__remove_dead_stores()
+        hoisted = self.__hoist_invariant_loads()
+        self.__rebuild(hoisted)
+        return self.report
+
+    # successors of an instruction, a successor equal to size is the end
+    def __successors(self, address):
+        opcode, args = self.code[address]
+        if opcode is None:
+            return (address + 1,)
+        if opcode == INSTRUCTION_ID.GO or opcode == FUSED_ID.JUMP:
+            return (args[0][1],)
+        if opcode in OpcodeTable.BRANCH_MASKS:
+            return args[0][1], address + 1
+        if opcode == INSTRUCTION_ID.EXIT:
+            return ()
+        if opcode == INSTRUCTION_ID.HOME:
+            # home returns after any call
+            return self.__returns
+        return (address + 1,)
+
+    @staticmethod
+    def __same(value1, value2):
+        if value1 is value2:
+            return True
+        if value1 is DataflowOptimizer.NAC or value2 is DataflowOptimizer.NAC:
+            return False
+        return type(value1) is type(value2) and value1 == value2
+
+    @staticmethod
+    def __join(state1, state2):
+        if state1 is None:
+            return state2
+        return tuple(v1 if DataflowOptimizer.__same(v1, v2) else DataflowOptimizer.NAC
+                     for (v1, v2) in zip(state1, state2))
+
+    @staticmethod
+    def __value(operand, state):
+        if operand[0] == TokenType.TKN_MEM:
+            return state[operand[1]]
+        return operand[1]
+
+    # forward conditional constant propagation, a branch on a known
+    # comparison only follows the edge it takes
+    def __propagate_constants(self):
+        nac = DataflowOptimizer.NAC
+        states = [None] * self.size
+        if self.zero_registers:
+            states[0] = (0,) * DataflowOptimizer.CMP + (FMT.CMP_NONE,)
+        else:
+            states[0] = (nac,) * DataflowOptimizer.CMP + (FMT.CMP_NONE,)
+        work = [0]
+        while work:
+            address = work.pop()
+            state = states[address]
+            out = self.__transfer(address, state)
+            opcode, args = self.code[address]
+            successors = self.__successors(address)
+            if opcode in OpcodeTable.BRANCH_MASKS and out[DataflowOptimizer.CMP] is not nac:
+                taken = out[DataflowOptimizer.CMP] & OpcodeTable.BRANCH_MASKS[opcode]
+                successors = (args[0][1],) if taken else (address + 1,)
+            for successor in successors:
+                if successor >= self.size:
+                    continue
+                joined = DataflowOptimizer.__join(states[successor], out)
+                if states[successor] is None or \
+                        not all(DataflowOptimizer.__same(v1, v2) for (v1, v2) in zip(joined, states[successor])):
+                    states[successor] = joined
+                    work.append(successor)
+        return states
+
+    def __transfer(self, address, state):
+        opcode, args = self.code[address]
+        nac = DataflowOptimizer.NAC
+        if opcode == INSTRUCTION_ID.LOAD:
+            out = list(state)
+            out[args[0][1]] = DataflowOptimizer.__value(args[1], state)
+            return tuple(out)
+        if opcode in DataflowOptimizer.ARITHMETIC:
+            out = list(state)
+            out[args[0][1]] = DataflowOptimizer.__compute(opcode, state[args[0][1]],
+                                                          DataflowOptimizer.__value(args[1], state))
+            return tuple(out)
+        if opcode in DataflowOptimizer.DATA_LOADS:
+            out = list(state)
+            out[args[0][1]] = nac
+            return tuple(out)
+        if opcode == INSTRUCTION_ID.EVAL:
+            op1 = DataflowOptimizer.__value(args[0], state)
+            op2 = DataflowOptimizer.__value(args[1], state)
+            out = list(state)
+            if op1 is nac or op2 is nac:
+                out[DataflowOptimizer.CMP] = nac
+            else:
+                flags = FlagMemory()
+                flags.compare(op1, op2)
+                out[DataflowOptimizer.CMP] = flags.state
+            return tuple(out)
+        return state
+
+    @staticmethod
+    def __compute(opcode, op1, op2):
+        nac = DataflowOptimizer.NAC
+        if op1 is nac or op2 is nac:
+            return nac
+        if opcode in DataflowOptimizer.DIVISIONS and op2 == 0:
+            return nac  # stays a runtime zero division error
+        try:
+            return DataflowOptimizer.ARITHMETIC[opcode](op1, op2)
+        except (OverflowError, ValueError):
+            return nac
+
+    def __fold_constants(self, states):
+        nac = DataflowOptimizer.NAC
+        for address in range(self.size):
+            state = states[address]
+            if state is None:
+                self.code[address] = [None, ()]
+                self.report["unreachable"] += 1
+                continue
+
+            opcode, args = self.code[address]
+            if opcode in OpcodeTable.BRANCH_MASKS and state[DataflowOptimizer.CMP] is not nac:
+                if state[DataflowOptimizer.CMP] & OpcodeTable.BRANCH_MASKS[opcode]:
+                    self.code[address] = [FUSED_ID.JUMP, args]
+                else:
+                    self.code[address] = [None, ()]
+                self.report["branches_folded"] += 1
+                continue
+
+            if opcode == INSTRUCTION_ID.LOAD or opcode in DataflowOptimizer.ARITHMETIC:
+                result = self.__transfer(address, state)[args[0][1]]
+                if result is not nac and not (opcode == INSTRUCTION_ID.LOAD and args[1][0] == TokenType.TKN_VAL):
+                    self.code[address] = [INSTRUCTION_ID.LOAD, (args[0], (TokenType.TKN_VAL, result))]
+                    self.report["constants_folded"] += 1
+                    continue
+
+            # known register operands read as constants
+            if opcode in (INSTRUCTION_ID.LOAD, INSTRUCTION_ID.EVAL, INSTRUCTION_ID.EXIT) \
+                    or opcode in DataflowOptimizer.ARITHMETIC or opcode in Program.DATA_OPCODES:
+                first = 1 if opcode in (INSTRUCTION_ID.LOAD,) or opcode in DataflowOptimizer.ARITHMETIC \
+                    or opcode in DataflowOptimizer.DATA_LOADS else 0
+                new_args = list(args)
+                for index in range(first, len(args)):
+                    operand = args[index]
+                    if operand[0] == TokenType.TKN_MEM and state[operand[1]] is not nac:
+                        new_args[index] = (TokenType.TKN_VAL, state[operand[1]])
+                self.code[address] = [opcode, tuple(new_args)]
+
+    # registers read and written by an instruction as bit masks,
+    # bit 16 is the comparison state
+    def __uses_defs(self, address):
+        opcode, args = self.code[address]
+        uses = 0
+        for operand in args:
+            if operand[0] == TokenType.TKN_MEM:
+                uses |= 1 << operand[1]
+        if opcode == INSTRUCTION_ID.LOAD or opcode in DataflowOptimizer.DATA_LOADS:
+            return uses & ~(1 << args[0][1]) | DataflowOptimizer.__source_bit(args[1]), 1 << args[0][1]
+        if opcode in DataflowOptimizer.ARITHMETIC:
+            return uses, 1 << args[0][1]
+        if opcode == INSTRUCTION_ID.EVAL:
+            return uses, DataflowOptimizer.CMP_BIT
+        if opcode in OpcodeTable.BRANCH_MASKS:
+            return DataflowOptimizer.CMP_BIT, 0
+        return uses, 0
+
+    @staticmethod
+    def __source_bit(operand):
+        return 1 << operand[1] if operand[0] == TokenType.TKN_MEM else 0
+
+    def __liveness(self):
+        live_in = [0] * self.size
+        changed = True
+        while changed:
+            changed = False
+            for address in range(self.size - 1, -1, -1):
+                live_out = 0
+                for successor in self.__successors(address):
+                    if successor < self.size:
+                        live_out |= live_in[successor]
+                uses, defs = self.__uses_defs(address)
+                live = uses | (live_out & ~defs)
+                if not live == live_in[address]:
+                    live_in[address] = live
+                    changed = True
+        return live_in
+
+    def __removable(self, address):
+        opcode, args = self.code[address]
+        if opcode in DataflowOptimizer.DIVISIONS:
+            # only a known non zero divisor can not fail
+            return args[1][0] == TokenType.TKN_VAL and not args[1][1] == 0
+        return opcode in (INSTRUCTION_ID.LOAD, INSTRUCTION_ID.EVAL) or opcode in DataflowOptimizer.ARITHMETIC
+
+    def __remove_dead_stores(self):
+        removed = True
+        while removed:
+            removed = False
+            live_in = self.__liveness()
+            for address in range(self.size):
+                if self.code[address][0] is None or not self.__removable(address):
+                    continue
+                live_out = 0
+                for successor in self.__successors(address):
+                    if successor < self.size:
+                        live_out |= live_in[successor]
+                if not self.__uses_defs(address)[1] & live_out:
+                    self.code[address] = [None, ()]
+                    self.report["dead_stores"] += 1
+                    removed = True
+        self.__live_in = self.__liveness()
+
+    # header -> constant loads moved in front of it. a load of a constant
+    # can leave a loop when it is the only write to its register inside
+    # the loop and the register is not read at the header before it
+    def __hoist_invariant_loads(self):
+        order, dominators = self.__dominators()
+        predecessors = [[] for _ in range(self.size)]
+        for address in order:
+            for successor in self.__successors(address):
+                if successor < self.size:
+                    predecessors[successor].append(address)
+
+        loops = {}
+        for address in order:
+            for successor in self.__successors(address):
+                if successor < self.size and self.__dominates(dominators, successor, address):
+                    body = loops.setdefault(successor, {successor})
+                    work = [address]
+                    while work:
+                        node = work.pop()
+                        if node not in body:
+                            body.add(node)
+                            work.extend(predecessors[node])
+
+        hoisted = {}
+        self.__loops = loops
+        for (header, body) in loops.items():
+            writes = {}
+            for address in body:
+                opcode, args = self.code[address]
+                if opcode == INSTRUCTION_ID.LOAD or opcode in DataflowOptimizer.ARITHMETIC \
+                        or opcode in DataflowOptimizer.DATA_LOADS:
+                    writes[args[0][1]] = writes.get(args[0][1], 0) + 1
+            for address in sorted(body):
+                opcode, args = self.code[address]
+                if not opcode == INSTRUCTION_ID.LOAD or not args[1][0] == TokenType.TKN_VAL:
+                    continue
+                register = args[0][1]
+                if writes[register] == 1 and not self.__live_in[header] & (1 << register):
+                    hoisted.setdefault(header, []).append((address, self.code[address]))
+                    self.code[address] = [None, ()]
+                    self.report["hoisted"] += 1
+        return hoisted
+
+    # immediate dominators with the Cooper, Harvey and Kennedy algorithm
+    def __dominators(self):
+        order = []
+        visited = [False] * self.size
+        stack = [(0, iter(self.__successors(0)))]
+        visited[0] = True
+        while stack:
+            node, successors = stack[-1]
+            for successor in successors:
+                if successor < self.size and not visited[successor]:
+                    visited[successor] = True
+                    stack.append((successor, iter(self.__successors(successor))))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        order.reverse()
+        position = {node: index for (index, node) in enumerate(order)}
+        predecessors = {node: [] for node in order}
+        for node in order:
+            for successor in self.__successors(node):
+                if successor in predecessors:
+                    predecessors[successor].append(node)
+
+        dominator = {order[0]: order[0]}
+        changed = True
+        while changed:
+            changed = False
+            for node in order[1:]:
+                new = None
+                for predecessor in predecessors[node]:
+                    if predecessor not in dominator:
+                        continue
+                    if new is None:
+                        new = predecessor
+                        continue
+                    finger1, finger2 = predecessor, new
+                    while not finger1 == finger2:
+                        while position[finger1] > position[finger2]:
+                            finger1 = dominator[finger1]
+                        while position[finger2] > position[finger1]:
+                            finger2 = dominator[finger2]
+                    new = finger1
+                if not dominator.get(node) == new:
+                    dominator[node] = new
+                    changed = True
+        return order, dominator
+
+    @staticmethod
+    def __dominates(dominators, node, other):
+        while True:
+            if other == node:
+                return True
+            parent = dominators.get(other)
+            if parent is None or parent == other:
+                return False
+            other = parent
+
+    # lay the kept instructions out again. a jump from outside a loop
+    # enters through the hoisted loads, a jump from inside goes to the
+    # header itself
+    def __rebuild(self, hoisted):
+        layout = []
+        entry = [0] * (self.size + 1)
+        placed = [0] * (self.size + 1)
+        for address in range(self.size):
+            entry[address] = len(layout)
+            for (origin, instruction) in hoisted.get(address, ()):
+                layout.append((instruction, self.lines[origin], None))
+            placed[address] = len(layout)
+            if self.code[address][0] is not None:
+                layout.append((self.code[address], self.lines[address], address))
+        entry[self.size] = placed[self.size] = len(layout)
+
+        memory = InstructionMemory()
+        for (new_address, (instruction, line, origin)) in enumerate(layout):
+            opcode, args = instruction
+            if opcode in (INSTRUCTION_ID.GO, FUSED_ID.JUMP) or opcode in OpcodeTable.BRANCH_MASKS:
+                target = args[0][1]
+                inside = target in hoisted and origin in self.__loops[target]
+                args = ((TokenType.TKN_ADR, placed[target] if inside else entry[target]),)
+            memory.i_set(new_address, (opcode, tuple(args)), line)
+
+        self.program.memory = memory
+        self.report["instructions_after"] = len(memory)
+
+
+# optional pass between the parser and the vm. it rewrites common
+# instruction runs into FUSED_ID instructions without moving any
+# address, so source lines and error reports stay as they were
+class PeepholeOptimizer:
+    CONST_OPERATIONS = {
+        INSTRUCTION_ID.ADD: ALOperation.add,
+        INSTRUCTION_ID.SUB: ALOperation.sub,
+        INSTRUCTION_ID.MUL: ALOperation.mul
+    }
+
+    def __init__(self, program):
+        self.program = program
+        self.memory = program.memory
+        self.report = {
+            "instructions": len(self.memory),
+            "eval_branch": 0,  # eval + ifXX pairs fused
+            "load_const": 0,  # constant arithmetic folded into a load
+            "jumps_threaded": 0,  # jumps retargeted past a jump
+            "fused": 0  # source instructions absorbed into fused ones
+        }
+
+    def optimize(self) -> dict:
+        self.__thread_jumps()
+        for address in range(len(self.memory)):
+            opcode, args = self.memory.i_at(address)
+            if opcode == INSTRUCTION_ID.EVAL:
+                self.__fuse_eval_branch(address, args)
+            elif opcode == INSTRUCTION_ID.LOAD:
+                self.__fuse_load_const(address, args)
+        return self.report
+
+    # a jump to an unconditional jump goes straight to its target. a go
+    # left by the program is a call pushing its return address, so
+    # jumps are never threaded through one
+    def __thread_jumps(self):
+        through = (FUSED_ID.JUMP,)
+        for address in range(len(self.memory)):
+            opcode, args = self.memory.i_at(address)
+            if opcode in (INSTRUCTION_ID.GO, FUSED_ID.JUMP) or opcode in OpcodeTable.BRANCH_MASKS:
+                target = self.__final_target(args[0][1], through)
+                if not target == args[0][1]:
+                    self.memory.i_set(address, (opcode, ((TokenType.TKN_ADR, target),)), self.memory.i_line(address))
+                    self.report["jumps_threaded"] += 1
+
+    def __final_target(self, address, through):
+        seen = set()
+        while address < len(self.memory) and address not in seen:
+            seen.add(address)
+            opcode, args = self.memory.i_at(address)
+            if opcode not in through:
+                break
+            address = args[0][1]
+        return address
+
+    def __fuse_eval_branch(self, address, args):
+        if address + 1 >= len(self.memory):
+            return
+        opcode, branch_args = self.memory.i_at(address + 1)
+        if opcode not in OpcodeTable.BRANCH_MASKS:
+            return
+        fused = (args[0], args[1], OpcodeTable.BRANCH_MASKS[opcode], branch_args[0][1], address + 2)
+        self.memory.i_set(address, (FUSED_ID.EVAL_BRANCH, fused), self.memory.i_line(address))
+        self.report["eval_branch"] += 1
+        self.report["fused"] += 2
+
+    def __fuse_load_const(self, address, args):
+        register, source = args
+        if not source[0] == TokenType.TKN_VAL:
+            return
+        value = source[1]
+        end = address + 1
+        while end < len(self.memory):
+            opcode, next_args = self.memory.i_at(end)
+            if opcode not in PeepholeOptimizer.CONST_OPERATIONS \
+                    or not next_args[0] == register or not next_args[1][0] == TokenType.TKN_VAL:
+                break
+            value = PeepholeOptimizer.CONST_OPERATIONS[opcode](value, next_args[1][1])
+            end += 1
+        if end == address + 1:
+            return
+        self.memory.i_set(address, (FUSED_ID.LOAD_CONST, (register[1], value, end)), self.memory.i_line(address))
+        self.report["load_const"] += 1
+        self.report["fused"] += end - address
+
+
+# compiles a trace recorded by the vm into a python function. a trace
+# is the path one iteration of a hot loop took from its header, as
+# (address, next address) pairs. registers become locals, the branches
+# taken on the trace become guards and a failing guard writes the
+# locals back and returns the address the interpreter resumes at
+class TraceCompiler:
+    HOT_LOOP = 50  # taken backward jumps before a loop header is traced
+    MAX_LENGTH = 1000  # longest trace recorded, longer loops stay interpreted
+    MAX_ABORTS = 3  # failed recordings before a loop header is given up
+
+    # branch taken for a flag mask, straight from the eval operands
+    CONDITIONS = {
+        FMT.FEQ_MASK: "{0} == {1}",
+        FMT.FNE_MASK: "{0} != {1}",
+        FMT.FGT_MASK: "{0} > {1}",
+        FMT.FLT_MASK: "not {0} >= {1}",
+        FMT.FGE_MASK: "{0} >= {1}",
+        FMT.FLE_MASK: "not {0} > {1}"
+    }
+    OPERATORS = {
+        INSTRUCTION_ID.ADD: "{0} + {1}",
+        INSTRUCTION_ID.SUB: "{0} - {1}",
+        INSTRUCTION_ID.MUL: "{0} * {1}",
+        INSTRUCTION_ID.IDIV: "int({0} / {1})",
+        INSTRUCTION_ID.DIV: "{0} / {1}"
+    }
+    UNTRACEABLE = (INSTRUCTION_ID.EXIT,)
+    COMPARE = "4 if ca > cb else (2 if ca == cb else 1)"  # FlagMemory.compare on the saved operands
+
+    def __init__(self, memory, name="<program>", call_depth=PVM.CALL_DEPTH, data=None):
+        self.memory = memory
+        self.name = name
+        self.call_depth = call_depth  # size of the vm call stack
+        self.data = data if data is not None else DataSegment(0)  # data memory of the vm
+        self.source = None  # python source of the last compiled trace
+        self.__constants = []
+
+    @staticmethod
+    def traceable(opcode) -> bool:
+        return opcode not in TraceCompiler.UNTRACEABLE
+
+    def compile(self, trace, header, closed):
+        """ returns trace(registers, flag_memory, vm, write) -> resume address.
+        a closed trace loops back to header, at most vm.trace_passes times
+        and at least once, any other ends at the address after its last
+        instruction. a guard failing on an instruction the interpreter has
+        to run itself returns ~address of that instruction """
+        self.__constants = []
+        self.__trace = trace
+        self.__closed = closed
+        self.__written = set()
+        self.__read = set()
+        self.__has_eval = False
+        self.__has_branch = False
+        self.__has_go = False
+        self.__has_home = False
+        self.__has_data = False
+        self.__scan()
+
+        self.__lines = []
+        self.__depth = 0
+        self.__emit("def trace(R, F, vm, write):")
+        self.__depth += 1
+        for register in sorted(self.__read | self.__written):
+            self.__emit("r%d = R[%d]" % (register, register))
+        if self.__has_eval or self.__has_branch:
+            self.__emit("cmp = F.state")
+        if self.__has_go or self.__has_home:
+            self.__emit("S = vm.call_stack")
+            self.__emit("sp = vm.stack_pointer")
+        if self.__has_data:
+            self.__emit("W = vm.data.words")
+            self.__emit("B = vm.data.bytes")
+
+        if closed:
+            # n counts the passes made, every exit takes them off the budget
+            self.__emit("for n in range(max(vm.trace_passes, 1)):")
+            self.__depth += 1
+        pending = self.__body(closed)
+        if closed:
+            self.__depth -= 1
+            self.__exit(str(header), pending)
+        else:
+            self.__exit(str(trace[-1][1]))
+
+        self.source = "\n".join(self.__lines) + "\n"
+        namespace = {"K": self.__constants}
+        exec(compile(self.source, "<trace %s@0x%x>" % (self.name, header), "exec"), namespace)
+        return namespace["trace"]
+
+    # registers read and written and the state the trace touches
+    def __scan(self):
+        for (address, _) in self.__trace:
+            opcode, args = self.memory.i_at(address)
+            if opcode == FUSED_ID.LOAD_CONST:
+                self.__written.add(args[0])
+                continue
+            if opcode in (INSTRUCTION_ID.EVAL, FUSED_ID.EVAL_BRANCH):
+                self.__has_eval = True
+            elif opcode in OpcodeTable.BRANCH_MASKS:
+                self.__has_branch = True
+            elif opcode == INSTRUCTION_ID.GO:
+                self.__has_go = True
+            elif opcode == INSTRUCTION_ID.HOME:
+                self.__has_home = True
+            if opcode in Program.DATA_OPCODES:
+                self.__has_data = True
+            if opcode in (INSTRUCTION_ID.LOAD, INSTRUCTION_ID.LOADW, INSTRUCTION_ID.LOADB) \
+                    or opcode in TraceCompiler.OPERATORS:
+                self.__written.add(args[0][1])
+            for operand in args:
+                if isinstance(operand, tuple) and operand[0] == TokenType.TKN_MEM:
+                    self.__read.add(operand[1])
+
+    def __body(self, closed):
+        # the comparison state is kept as the operands of the last eval
+        # and only turned into a flag state where it is needed
+        pending = False
+        known_returns = []  # calls made earlier in the trace and not returned from yet
+        first_eval = None
+        for (position, (address, next_address)) in enumerate(self.__trace):
+            opcode, args = self.memory.i_at(address)
+            self.__emit("# 0x%x line %s" % (address, self.memory.i_line(address)))
+            if opcode in (INSTRUCTION_ID.EVAL, FUSED_ID.EVAL_BRANCH):
+                if first_eval is None:
+                    first_eval = position
+                self.__emit("ca = %s" % self.__value(args[0]))
+                self.__emit("cb = %s" % self.__value(args[1]))
+                pending = True
+            if opcode == FUSED_ID.EVAL_BRANCH:
+                self.__guard(args[2], args[3], args[4], next_address, pending)
+            elif opcode in OpcodeTable.BRANCH_MASKS:
+                self.__guard(OpcodeTable.BRANCH_MASKS[opcode], args[0][1], address + 1, next_address, pending)
+            elif opcode == INSTRUCTION_ID.LOAD:
+                self.__emit("%s = %s" % (self.__value(args[0]), self.__value(args[1])))
+            elif opcode == FUSED_ID.LOAD_CONST:
+                self.__emit("r%d = %s" % (args[0], self.__constant(args[1])))
+            elif opcode in TraceCompiler.OPERATORS:
+                register, divisor = self.__value(args[0]), self.__value(args[1])
+                if opcode in (INSTRUCTION_ID.IDIV, INSTRUCTION_ID.DIV):
+                    # the interpreter reports the zero division with its line
+                    self.__emit("if %s == 0:" % divisor)
+                    self.__exit("~%d" % address, pending, 1)
+                self.__emit("%s = %s" % (register, TraceCompiler.OPERATORS[opcode].format(register, divisor)))
+            elif opcode == INSTRUCTION_ID.PUTC:
+                self.__emit("write(chr(int(%s)))" % self.__value(args[0]))
+            elif opcode == INSTRUCTION_ID.LOG:
+                self.__emit("write(\"%%s\\n\" %% %s)" % self.__value(args[0]))
+            elif opcode in Program.DATA_OPCODES:
+                self.__data_access(opcode, args, address, pending)
+            elif opcode == INSTRUCTION_ID.GO:
+                # a full stack is left to the interpreter to report
+                self.__emit("if sp == %d:" % self.call_depth)
+                self.__exit("~%d" % address, pending, 1)
+                self.__emit("S[sp] = %d" % address)
+                self.__emit("sp += 1")
+                known_returns.append(address)
+            elif opcode == INSTRUCTION_ID.HOME:
+                if known_returns:
+                    known_returns.pop()
+                else:
+                    # the home of a call made before the trace returns
+                    # where the recording went, or the interpreter runs it
+                    self.__emit("if not (sp and S[sp - 1] == %d):" % (next_address - 1))
+                    self.__exit("~%d" % address, pending, 1)
+                self.__emit("sp -= 1")
+
+        # a guard ahead of the first eval reads the state of the last
+        # iteration, so it is made concrete before looping back
+        if closed and pending and self.__guards_before(first_eval):
+            self.__emit("cmp = " + TraceCompiler.COMPARE)
+        return pending
+
+    def __guard(self, mask, target, fall_through, next_address, pending):
+        if target == fall_through:
+            return
+        condition = TraceCompiler.CONDITIONS[mask].format("ca", "cb") if pending else "cmp & %d" % mask
+        if next_address == target:
+            self.__emit("if not (%s):" % condition)
+            self.__exit(str(fall_through), pending, 1)
+        else:
+            self.__emit("if %s:" % condition)
+            self.__exit(str(target), pending, 1)
+
+    def __guards_before(self, position) -> bool:
+        for (address, next_address) in self.__trace[:position]:
+            opcode, args = self.memory.i_at(address)
+            if opcode in OpcodeTable.BRANCH_MASKS or opcode in (INSTRUCTION_ID.GO, INSTRUCTION_ID.HOME) \
+                    or opcode in (INSTRUCTION_ID.IDIV, INSTRUCTION_ID.DIV) or opcode in Program.DATA_OPCODES:
+                return True
+        return False
+
+    # data memory is used straight through the views of the vm while
+    # addresses and values are ints in range, anything else leaves the
+    # trace so the interpreter truncates or reports it
+    def __data_access(self, opcode, args, address, pending):
+        words = opcode in (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.STOREW)
+        view, size = ("W", len(self.data.words)) if words else ("B", len(self.data.bytes))
+        load = opcode in (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.LOADB)
+        if load:
+            conditions = [TraceCompiler.__fits(args[1], 0, size - 1)]
+        else:
+            low, high = (DataSegment.WORD_MIN, DataSegment.WORD_MAX) if words else (0x00, 0xff)
+            conditions = [TraceCompiler.__fits(args[0], 0, size - 1), TraceCompiler.__fits(args[1], low, high)]
+            if not self.data.writable:
+                conditions.append("False")
+        conditions = [condition for condition in conditions if condition is not None]
+        if conditions:
+            self.__emit("if not (%s):" % " and ".join(conditions))
+            self.__exit("~%d" % address, pending, 1)
+        if load:
+            self.__emit("%s = %s[%s]" % (self.__value(args[0]), view, self.__value(args[1])))
+        else:
+            self.__emit("%s[%s] = %s" % (view, self.__value(args[0]), self.__value(args[1])))
+
+    # condition for an operand being an int in low..high, None for a
+    # constant known to be one
+    @staticmethod
+    def __fits(operand, low, high):
+        if operand[0] == TokenType.TKN_MEM:
+            register = "r%d" % operand[1]
+            return "%s.__class__ is int and %d <= %s <= %d" % (register, low, register, high)
+        value = operand[1]
+        return None if isinstance(value, int) and low <= value <= high else "False"
+
+    # writes the locals back and leaves the trace
+    def __exit(self, address, pending=False, indent=0):
+        self.__depth += indent
+        for register in sorted(self.__written):
+            self.__emit("R[%d] = r%d" % (register, register))
+        if pending:
+            self.__emit("F.state = " + TraceCompiler.COMPARE)
+        elif self.__has_eval:
+            self.__emit("F.state = cmp")
+        if self.__has_go or self.__has_home:
+            self.__emit("vm.stack_pointer = sp")
+        if self.__closed:
+            self.__emit("vm.trace_passes -= n + 1")
+        self.__emit("return " + address)
+        self.__depth -= indent
+
+    def __value(self, operand) -> str:
+        if operand[0] == TokenType.TKN_MEM:
+            return "r%d" % operand[1]
+        return self.__constant(operand[1])
+
+    def __constant(self, value) -> str:
+        if isinstance(value, float) and not abs(value) < float("inf"):
+            # inf and nan have no literal
+            self.__constants.append(value)
+            return "K[%d]" % (len(self.__constants) - 1)
+        return repr(value)
+
+    def __emit(self, line):
+        self.__lines.append("    " * self.__depth + line)
+
+
+# writes a program out as a standalone python module that imports
+# neither lang/ nor plas. instructions are grouped into blocks, a block
+# with a single way in is inlined into the one before it, blocks that
+# jump back to their own start become while loops and the remaining
+# blocks are picked by the pc through a binary if tree
+class PythonEmitter:
+    def __init__(self, program, call_depth=PVM.CALL_DEPTH):
+        self.program = program
+        self.call_depth = call_depth
+        self.memory = program.memory
+        self.size = len(program.memory)
+
+    def emit(self) -> str:
+        """ returns the source of the module """
+        self.__returns = self.__return_addresses()
+        self.__find_blocks()
+        self.__direct = self.__evaluated_before_branches()
+        self.__lines = []
+        self.__depth = 0
+        self.__emit("#!/usr/bin/env python3")
+        self.__emit("# generated by plas %s from %s, regenerate it instead of editing" %
+                    (PLAS_VERSION, self.program.name))
+        self.__emit("import sys")
+        data_size = self.program.data_size()
+        if data_size:
+            self.__emit("import array")
+            self.__emit("")
+            self.__emit("")
+            self.__emit("def integer(value):")
+            self.__depth += 1
+            self.__emit("\"\"\" a data address or value, None for inf and nan \"\"\"")
+            self.__emit("try:")
+            self.__emit("    return int(value)")
+            self.__emit("except (OverflowError, ValueError):")
+            self.__emit("    return None")
+            self.__depth -= 1
+        self.__emit("")
+        self.__emit("")
+        self.__emit("def run(write):")
+        self.__depth += 1
+        self.__emit("\"\"\" runs the program, output goes through write, returns the exit code \"\"\"")
+        for register in sorted(self.__registers()):
+            self.__emit("r%d = 0" % register)
+        if not self.__direct:
+            self.__emit("cmp = %d" % FMT.CMP_NONE)
+        elif self.__has(INSTRUCTION_ID.EVAL) or self.__has(FUSED_ID.EVAL_BRANCH):
+            self.__emit("ca = cb = 0")
+        if self.__has(INSTRUCTION_ID.GO) or self.__has(INSTRUCTION_ID.HOME):
+            self.__emit("stack = [0] * %d" % self.call_depth)
+            self.__emit("sp = 0")
+        if data_size:
+            self.__emit("B = memoryview(bytearray(%d))" % data_size)
+            self.__emit("W = B.cast(\"q\")")
+            for (word, values, _) in self.program.data:
+                self.__emit("W[%d:%d] = array.array(\"q\", %r)" % (word, word + len(values), list(values)))
+        heads = [head for head in sorted(self.__blocks) if head not in self.__inlined]
+        if self.__returns:
+            heads.append(self.size)  # home past the last instruction ends the program
+        if heads:
+            self.__emit("pc = 0")
+            self.__emit("while True:")
+            self.__depth += 1
+            self.__dispatch(heads)
+        else:
+            # nothing to run, a comment only source or one optimized away
+            self.__emit("return %d" % SysExit.EXIT_SUCCESS)
+        self.__depth = 0
+        self.__emit("")
+        self.__emit("")
+        self.__emit("if __name__ == \"__main__\":")
+        self.__depth += 1
+        self.__emit("exit_code = run(sys.stdout.write)")
+        self.__emit("sys.stdout.flush()")
+        self.__emit("sys.exit(exit_code)")
+        return "\n".join(self.__lines) + "\n"
+
+    # addresses home may return to, the one after every call. the
+    # program left a go only where it is a call
+    def __return_addresses(self) -> set:
+        returns = set()
+        for address in range(self.size):
+            if self.memory.i_at(address)[0] == INSTRUCTION_ID.GO:
+                returns.add(address + 1)
+        return returns
+
+    # (taken target or None, fall through or None) of an instruction
+    def __successors(self, address):
+        opcode, args = self.memory.i_at(address)
+        if opcode == FUSED_ID.EVAL_BRANCH:
+            return args[3], args[4]
+        if opcode in OpcodeTable.BRANCH_MASKS:
+            return args[0][1], address + 1
+        if opcode in (INSTRUCTION_ID.GO, FUSED_ID.JUMP):
+            return args[0][1], None
+        if opcode == FUSED_ID.LOAD_CONST:
+            return args[2], None
+        if opcode in (INSTRUCTION_ID.EXIT, INSTRUCTION_ID.HOME):
+            return None, None
+        return None, address + 1
+
+    def __find_blocks(self):
+        leaders = {0x00} | self.__returns
+        for address in range(self.size):
+            target, fall_through = self.__successors(address)
+            if target is not None:
+                leaders.add(target)
+                leaders.add(address + 1)
+            if not fall_through == address + 1:
+                leaders.add(address + 1)
+
+        # reachable blocks only, from the entry and the return addresses
+        self.__blocks = {}  # start -> addresses
+        self.__predecessors = {}
+        pending = sorted({0x00} | self.__returns)
+        while pending:
+            start = pending.pop()
+            if start >= self.size or start in self.__blocks:
+                continue
+            block = [start]
+            while block[-1] + 1 < self.size and block[-1] + 1 not in leaders \
+                    and self.__successors(block[-1])[1] == block[-1] + 1:
+                block.append(block[-1] + 1)
+            self.__blocks[start] = block
+            for successor in set(self.__successors(block[-1])) - {None}:
+                self.__predecessors[successor] = self.__predecessors.get(successor, 0) + 1
+                pending.append(successor)
+
+        # a block is inlined into its only predecessor when it is entered
+        # straight from it, by falling through or by an unconditional jump
+        self.__inlined = {}  # inlined block -> block it is inlined into
+        for (start, block) in self.__blocks.items():
+            target, fall_through = self.__successors(block[-1])
+            following = fall_through if fall_through is not None else target
+            if following is None or following == start or following not in self.__blocks:
+                continue
+            if self.__predecessors.get(following) == 1 and following not in self.__returns and not following == 0x00:
+                self.__inlined[following] = start
+        self.__chains = {}
+        for start in self.__blocks:
+            if start in self.__inlined:
+                continue
+            chain = [start]
+            following = self.__following(start)
+            while following is not None and not following == start:
+                chain.append(following)
+                following = self.__following(following)
+            self.__chains[start] = chain
+
+    def __following(self, start):
+        target, fall_through = self.__successors(self.__blocks[start][-1])
+        following = fall_through if fall_through is not None else target
+        if self.__inlined.get(following) == start:
+            return following
+        return None
+
+    # the flags can be kept as the last eval operands when no branch
+    # can run before the first eval, otherwise as FlagMemory state
+    def __evaluated_before_branches(self) -> bool:
+        seen = set()
+        pending = [0x00] + sorted(self.__returns)
+        while pending:
+            address = pending.pop()
+            if address >= self.size or address in seen:
+                continue
+            seen.add(address)
+            opcode = self.memory.i_at(address)[0]
+            if opcode in OpcodeTable.BRANCH_MASKS:
+                return False
+            if opcode in (INSTRUCTION_ID.EVAL, FUSED_ID.EVAL_BRANCH):
+                continue
+            pending.extend(set(self.__successors(address)) - {None})
+        return True
+
+    def __registers(self) -> set:
+        registers = set()
+        for address in range(self.size):
+            opcode, args = self.memory.i_at(address)
+            if opcode == FUSED_ID.LOAD_CONST:
+                registers.add(args[0])
+            for operand in args:
+                if isinstance(operand, tuple) and operand[0] == TokenType.TKN_MEM:
+                    registers.add(operand[1])
+        return registers
+
+    def __dispatch(self, heads):
+        if len(heads) == 1:
+            if heads[0] == self.size:
+                self.__emit("return %d" % SysExit.EXIT_SUCCESS)
+            else:
+                self.__chain(heads[0])
+            return
+        middle = len(heads) // 2
+        self.__emit("if pc < %d:" % heads[middle])
+        self.__depth += 1
+        self.__dispatch(heads[:middle])
+        self.__depth -= 1
+        self.__emit("else:")
+        self.__depth += 1
+        self.__dispatch(heads[middle:])
+        self.__depth -= 1
+
+    def __chain(self, head):
+        chain = self.__chains[head]
+        self.__loop = None
+        for start in chain:
+            if head in self.__successors(self.__blocks[start][-1]):
+                self.__loop = head
+        if self.__loop is not None:
+            self.__emit("while True:")
+            self.__depth += 1
+        body = len(self.__lines)
+        for (position, start) in enumerate(chain):
+            # the block inlined next simply continues below
+            self.__inline = chain[position + 1] if position + 1 < len(chain) else None
+            block = self.__blocks[start]
+            for address in block:
+                self.__instruction(address, address == block[-1], self.__inline is None and address == block[-1])
+        if self.__loop is not None:
+            # a block only jumping to itself leaves nothing but comments
+            if all(line.lstrip().startswith("#") for line in self.__lines[body:]):
+                self.__emit("continue")
+            self.__depth -= 1
+
+    def __instruction(self, address, end, last):
+        opcode, args = self.memory.i_at(address)
+        self.__emit("# 0x%x line %s" % (address, self.memory.i_line(address)))
+        if opcode in (INSTRUCTION_ID.EVAL, FUSED_ID.EVAL_BRANCH):
+            if self.__direct:
+                self.__emit("ca = %s" % self.__value(args[0]))
+                self.__emit("cb = %s" % self.__value(args[1]))
+            else:
+                self.__emit("cmp = 4 if {0} > {1} else (2 if {0} == {1} else 1)".format(
+                    self.__value(args[0]), self.__value(args[1])))
+        if opcode == FUSED_ID.EVAL_BRANCH:
+            self.__branch(args[2], args[3], args[4], last)
+        elif opcode in OpcodeTable.BRANCH_MASKS:
+            self.__branch(OpcodeTable.BRANCH_MASKS[opcode], args[0][1], address + 1, last)
+        elif opcode == INSTRUCTION_ID.LOAD:
+            self.__emit("%s = %s" % (self.__value(args[0]), self.__value(args[1])))
+        elif opcode == FUSED_ID.LOAD_CONST:
+            self.__emit("r%d = %s" % (args[0], self.__constant(args[1])))
+            self.__transfer(args[2], last)
+        elif opcode in TraceCompiler.OPERATORS:
+            register, divisor = self.__value(args[0]), self.__value(args[1])
+            if opcode in (INSTRUCTION_ID.IDIV, INSTRUCTION_ID.DIV):
+                self.__fail("%s == 0" % divisor, PlasZeroDivisionError(self.memory.i_line(address)))
+            self.__emit("%s = %s" % (register, TraceCompiler.OPERATORS[opcode].format(register, divisor)))
+        elif opcode == INSTRUCTION_ID.PUTC:
+            self.__emit("write(chr(int(%s)))" % self.__value(args[0]))
+        elif opcode == INSTRUCTION_ID.LOG:
+            self.__emit("write(\"%%s\\n\" %% %s)" % self.__value(args[0]))
+        elif opcode == INSTRUCTION_ID.EXIT:
+            if args[0][0] == TokenType.TKN_VAL:
+                self.__emit("return %d" % int(args[0][1]))
+            else:
+                self.__emit("return int(%s)" % self.__value(args[0]))
+        elif opcode in Program.DATA_OPCODES:
+            self.__data_access(opcode, args, self.memory.i_line(address))
+        elif opcode == INSTRUCTION_ID.HOME:
+            self.__fail("not sp", PlasStackError.underflow(self.memory.i_line(address)))
+            self.__emit("sp -= 1")
+            self.__emit("pc = stack[sp] + 1")
+            self.__leave(last)
+        elif opcode in (INSTRUCTION_ID.GO, FUSED_ID.JUMP):
+            if opcode == INSTRUCTION_ID.GO:
+                self.__fail("sp == %d" % self.call_depth,
+                            PlasStackError.overflow(self.memory.i_line(address), self.call_depth))
+                self.__emit("stack[sp] = %d" % address)
+                self.__emit("sp += 1")
+            self.__transfer(args[0][1], last)
+        if end and self.__successors(address) == (None, address + 1):
+            self.__transfer(address + 1, last)
+
+    # the same checks in the same order as the interpreter, an emitted
+    # program always has a writable data segment of its own
+    def __data_access(self, opcode, args, line):
+        size = self.program.data_size()
+        words = opcode in (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.STOREW)
+        view, count = ("W", size // DataSegment.WORD_SIZE) if words else ("B", size)
+        if opcode in (INSTRUCTION_ID.LOADW, INSTRUCTION_ID.LOADB):
+            self.__emit("a = integer(%s)" % self.__value(args[1]))
+            self.__fail("a is None or not 0 <= a < %d" % count, PlasMemoryError.out_of_range(line, size))
+            self.__emit("%s = %s[a]" % (self.__value(args[0]), view))
+            return
+        low, high = (DataSegment.WORD_MIN, DataSegment.WORD_MAX) if words else (0x00, 0xff)
+        self.__emit("a = integer(%s)" % self.__value(args[0]))
+        self.__fail("a is None or not 0 <= a < %d" % count, PlasMemoryError.out_of_range(line, size))
+        self.__emit("v = integer(%s)" % self.__value(args[1]))
+        self.__fail("v is None or not %d <= v <= %d" % (low, high),
+                    PlasMemoryError.bad_value(line, "word" if words else "byte"))
+        self.__emit("%s[a] = v" % view)
+
+    # reports a runtime error the way the interpreter does when condition holds
+    def __fail(self, condition, error):
+        self.__emit("if %s:" % condition)
+        self.__depth += 1
+        self.__emit("write(%r)" % PythonEmitter.__logged(error))
+        self.__emit("return %d" % error.exit_code)
+        self.__depth -= 1
+
+    def __branch(self, mask, target, fall_through, last):
+        if not target == fall_through:
+            condition = TraceCompiler.CONDITIONS[mask].format("ca", "cb") if self.__direct else "cmp & %d" % mask
+            self.__emit("if %s:" % condition)
+            self.__depth += 1
+            self.__transfer(target, False)
+            self.__depth -= 1
+        self.__transfer(fall_through, last)
+
+    # moves to another block, the loop head continues the while loop and
+    # anything else goes back through the dispatch with pc set
+    def __transfer(self, target, last):
+        if target >= self.size:
+            self.__emit("return %d" % SysExit.EXIT_SUCCESS)
+            return
+        if target == self.__inline:
+            return
+        if target == self.__loop:
+            if not last:
+                self.__emit("continue")
+            return
+        self.__emit("pc = %d" % target)
+        self.__leave(last)
+
+    def __leave(self, last):
+        if self.__loop is not None:
+            self.__emit("break")
+        elif not last:
+            self.__emit("continue")
+
+    def __value(self, operand) -> str:
+        if operand[0] == TokenType.TKN_MEM:
+            return "r%d" % operand[1]
+        return self.__constant(operand[1])
+
+    @staticmethod
+    def __constant(value) -> str:
+        if isinstance(value, float) and not abs(value) < float("inf"):
+            return "float(%r)" % repr(value)
+        return repr(value)
+
+    # the exact text the interpreter logs for an error
+    @staticmethod
+    def __logged(error) -> str:
+        text = io.StringIO()
+        with contextlib.redirect_stdout(text):
+            error.log()
+        return text.getvalue()
+
+    def __has(self, instruction_id):
+        for address in range(self.size):
+            if self.memory.i_at(address)[0] == instruction_id:
+                return True
+        return False
+
+    def __emit(self, line):
+        self.__lines.append("    " * self.__depth + line if line else "")
+
+
+class BatchTimeout(Exception):
+    pass
+
+
+# runs many programs across a pool of worker processes. workers live
+# for the whole batch so interpreter startup is paid once per worker.
+# the per program timeout relies on SIGALRM inside the worker and is
+# not enforced on platforms without it
+class BatchRunner:
+    REPORT_FIELDS = ("file", "status", "exit_code", "output_bytes", "output_sha256",
+                     "compile_seconds", "run_seconds", "error")
+
+    def __init__(self, files, jobs=None, timeout=None, cache=True, cache_dir=None, optimize=0):
+        self.files = list(files)
+        self.optimize = optimize
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cache = cache
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def expand(patterns) -> list:
+        """ directories expand to the .plas files inside them, anything else is a glob """
+        files = []
+        for pattern in patterns:
+            if os.path.isdir(pattern):
+                files.extend(sorted(glob.glob(os.path.join(pattern, "*.plas"))))
+            else:
+                files.extend(sorted(glob.glob(pattern)))
+        return files
+
+    def run(self) -> list:
+        """ returns one record per file, in the order of self.files """
+        if not self.files:
+            return []
+        tasks = [(file, self.timeout, self.cache, self.cache_dir, self.optimize) for file in self.files]
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with concurrent.futures.ProcessPoolExecutor(self.jobs, mp_context=context,
+                                                    initializer=BatchRunner._init_worker) as pool:
+            chunk_size = max(1, len(tasks) // (self.jobs * 4))
+            return list(pool.map(BatchRunner._run_one, tasks, chunksize=chunk_size))
+
+    @staticmethod
+    def summary(records: list, wall_seconds: float) -> dict:
+        statuses = {}
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        return {
+            "programs": len(records),
+            "statuses": statuses,
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_seconds": round(sum(r["compile_seconds"] + r["run_seconds"] for r in records), 6)
+        }
+
+    @staticmethod
+    def write_report(records: list, summary: dict, file: str):
+        """ json report, or csv when the file name ends with .csv """
+        if file.endswith(".csv"):
+            with open(file, "w", newline="") as f:
+                writer = csv.DictWriter(f, BatchRunner.REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(records)
+            return
+
+        with open(file, "w") as f:
+            json.dump({"summary": summary, "programs": records}, f, indent=2)
+
+    @staticmethod
+    def _init_worker():
+        if hasattr(signal, "SIGALRM"):
+            signal.signal(signal.SIGALRM, BatchRunner._alarm)
+
+    @staticmethod
+    def _alarm(signum, frame):
+        raise BatchTimeout()
+
+    @staticmethod
+    def _run_one(task) -> dict:
+        file, timeout, cache, cache_dir, optimize = task
+        record = {field: None for field in BatchRunner.REPORT_FIELDS}
+        record["file"] = file
+        record["compile_seconds"] = 0.0
+        record["run_seconds"] = 0.0
+        alarm = timeout and hasattr(signal, "SIGALRM")
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+
+        phase, start = "compile", time.perf_counter()
+        try:
+            try:
+                program = Program.from_file(file, cache=cache, cache_dir=cache_dir)
+                if optimize:
+                    program.optimize(optimize)
+                record["compile_seconds"] = time.perf_counter() - start
+                phase, start = "run", time.perf_counter()
+                result = program.run()
+                record["run_seconds"] = time.perf_counter() - start
+            finally:
+                # disarmed before any handler runs. a timer firing in here
+                # has used its only shot, so the handlers cannot be cut short
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except BatchTimeout:
+            record[phase + "_seconds"] = time.perf_counter() - start
+            record["status"] = "timeout"
+            record["error"] = "timed out after %ss while %s" % (timeout, "compiling" if phase == "compile" else "running")
+            return record
+        except PlasSyntaxError as error:
+            record["compile_seconds"] = time.perf_counter() - start
+            record["status"] = "syntax_error"
+            record["exit_code"] = error.exit_code
+            record["error"] = str(error)
+            return record
+        except Exception as error:
+            record["status"] = "crash"
+            record["error"] = "%s: %s" % (type(error).__name__, error)
+            return record
+
+        record["exit_code"] = result.exit_code
+        record["output_bytes"] = len(result.output)
+        record["output_sha256"] = hashlib.sha256(result.output).hexdigest()
+        record["status"] = "ok" if result.error is None else "runtime_error"
+        if result.error is not None:
+            record["error"] = str(result.error)
+        return record
+
+
+# one program held by a scheduler, with its vm, its budgets and what
+# it has used of them so far. result is set once it has stopped
+class ScheduledTask:
+    def __init__(self, program, output, priority, max_instructions, max_seconds):
+        self.program = program
+        self.priority = priority
+        self.max_instructions = max_instructions  # None runs without an instruction budget
+        self.max_seconds = max_seconds  # seconds spent in its own slices, None runs without a time budget
+        self.sink = None
+        if output is None:
+            self.sink = BytesSink()
+            output = OutputChannel(self.sink, policy=FlushPolicy.EXIT)
+        self.output = output
+        self.vm = PVM(program, output)
+        self.executed = 0
+        self.seconds = 0.0
+        self.result = None  # RunResult once the program has stopped
+
+    def finish(self, exit_code, error=None):
+        if error is not None:
+            self.output.flush()
+        self.result = RunResult(exit_code, self.sink.getvalue() if self.sink else None, error)
+
+    def over_budget(self):
+        """ the reason the task went past a budget, None while it is within them """
+        if self.max_instructions is not None and self.executed >= self.max_instructions:
+            return "instruction budget of %d exceeded" % self.max_instructions
+        if self.max_seconds is not None and self.seconds >= self.max_seconds:
+            return "time budget of %ss exceeded" % self.max_seconds
+        return None
+
+
+# runs many programs in one process without threads by switching
+# between their vms every slice instructions. round robin takes turns
+# in order of arrival, priority always runs the highest priority task
+# left and takes turns among equal priorities. a task going past its
+# instruction or time budget is stopped with EXIT_BUDGET_EXCEEDED, the
+# time budget is checked between slices so it can overrun by one slice
+class Scheduler:
+    ROUND_ROBIN = "round-robin"
+    PRIORITY = "priority"
+    policies = (ROUND_ROBIN, PRIORITY)
+    DEFAULT_SLICE = 1000
+
+    def __init__(self, slice_size=DEFAULT_SLICE, policy=ROUND_ROBIN):
+        if policy not in Scheduler.policies:
+            raise ValueError("unknown scheduling policy %s" % policy)
+        if slice_size < 1:
+            raise ValueError("slice size must be at least 1")
+        self.slice_size = slice_size
+        self.policy = policy
+        self.tasks = []
+        self.__ready = []  # heap of (key, sequence, task)
+        self.__sequence = 0  # pushes so far, orders tasks of the same key
+
+    def add(self, program, output=None, priority=0, max_instructions=None, max_seconds=None) -> ScheduledTask:
+        """ queues a program, a Program or a raw parser address table.
+        output defaults to an in memory buffer returned with the result """
+        if not isinstance(program, Program):
+            program = Program(program)
+        task = ScheduledTask(program, output, priority, max_instructions, max_seconds)
+        self.tasks.append(task)
+        self.__push(task)
+        return task
+
+    def run(self) -> list:
+        """ runs every queued task to its end and returns their RunResults in the order they were added """
+        clock = time.perf_counter
+        while self.__ready:
+            task = heapq.heappop(self.__ready)[2]
+            limit = self.slice_size
+            if task.max_instructions is not None:
+                limit = min(limit, task.max_instructions - task.executed)
+            start = clock()
+            try:
+                task.executed += task.vm.step(limit)
+            except PlasRuntimeError as error:
+                task.finish(error.exit_code, error)
+                continue
+            finally:
+                task.seconds += clock() - start
+
+            if task.vm.finished():
+                task.finish(task.vm.exit_code)
+                continue
+            reason = task.over_budget()
+            if reason is not None:
+                line = task.program.memory.i_line(task.vm.instruction_pointer)
+                error = PlasBudgetError(line, reason)
+                task.finish(error.exit_code, error)
+                continue
+            self.__push(task)
+
+        return [task.result for task in self.tasks]
+
+    # a task goes back behind every task of its priority, so equal
+    # priorities take turns
+    def __push(self, task):
+        self.__sequence += 1
+        key = -task.priority if self.policy == Scheduler.PRIORITY else 0
+        heapq.heappush(self.__ready, (key, self.__sequence, task))
+
+
+# outcome of every lane of a lane engine run
+class LaneResult:
+    def __init__(self, exit_codes, outputs, errors):
+        self.exit_codes = exit_codes  # numpy array, one exit code per lane
+        self.outputs = outputs  # output text of each lane
+        self.errors = errors  # lane -> PlasError of a failed lane
+
+    def __len__(self):
+        return len(self.outputs)
+
+    def result(self, lane) -> RunResult:
+        """ the outcome of one lane, like Program.run returns it """
+        return RunResult(int(self.exit_codes[lane]), self.outputs[lane].encode("utf-8"), self.errors.get(lane))
+
+
+# runs one program over many lanes at once, every lane starting from
+# its own registers. registers hold one numpy array per register with
+# a lane per element, the instruction at the lowest instruction pointer
+# runs next for every lane waiting there, so lanes branching apart run
+# under masks and meet again where their paths join.
+# values are float64 with a mask telling which lanes hold an integer.
+# a lane that would leave what float64 holds exactly, or that putc
+# or exit would fail on, is run again on its own by a PVM so every
+# lane ends exactly the way a PVM run from the same registers does
+class LaneEngine:
+    EXACT = 2 ** 53  # integers above this are not exact as float64
+    CALL_DEPTH = 64  # nested calls per lane, deeper lanes go to a PVM with the full stack
+
+    def __init__(self, program):
+        np = LaneEngine.numpy()
+        self.np = np
+        self.program = program if isinstance(program, Program) else Program(program)
+        memory = self.program.memory
+        self.total_ins = len(memory)
+        self.__instructions = [memory.i_at(address) for address in range(self.total_ins)]
+        self.__operations = {
+            INSTRUCTION_ID.PUTC: self.__ins_putc,
+            INSTRUCTION_ID.LOAD: self.__ins_load,
+            INSTRUCTION_ID.GO: self.__ins_go,
+            INSTRUCTION_ID.EXIT: self.__ins_exit,
+            INSTRUCTION_ID.EVAL: self.__ins_eval,
+            INSTRUCTION_ID.IFEQ: self.__ins_branch,
+            INSTRUCTION_ID.IFNE: self.__ins_branch,
+            INSTRUCTION_ID.IFGT: self.__ins_branch,
+            INSTRUCTION_ID.IFLT: self.__ins_branch,
+            INSTRUCTION_ID.IFGE: self.__ins_branch,
+            INSTRUCTION_ID.IFLE: self.__ins_branch,
+            INSTRUCTION_ID.ADD: self.__ins_arithmetic,
+            INSTRUCTION_ID.SUB: self.__ins_arithmetic,
+            INSTRUCTION_ID.MUL: self.__ins_arithmetic,
+            INSTRUCTION_ID.IDIV: self.__ins_division,
+            INSTRUCTION_ID.DIV: self.__ins_division,
+            INSTRUCTION_ID.HOME: self.__ins_home,
+            INSTRUCTION_ID.LOG: self.__ins_log,
+            FUSED_ID.EVAL_BRANCH: self.__ins_eval_branch,
+            FUSED_ID.LOAD_CONST: self.__ins_load_const,
+            FUSED_ID.JUMP: self.__ins_jump
+        }
+
+    @staticmethod
+    def numpy():
+        """ numpy is optional and only needed here, it is imported on
+        first use so plain runs do not pay for loading it """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("the lane engine needs numpy, pip install numpy") from None
+        return numpy
+
+    def run(self, registers, lanes=None) -> LaneResult:
+        """ runs every lane to its end. registers maps a register, by name
+        like "$3" or by index, to its start value in every lane. lanes is
+        needed when no register is given, registers not given start at 0 """
+        np = self.np
+        starts = {}
+        for (register, values) in registers.items():
+            index = MemoryAddressTable.memory_addresses[register] if isinstance(register, str) else register
+            starts[index] = np.asarray(values)
+            if lanes is None:
+                lanes = len(starts[index])
+            if not len(starts[index]) == lanes:
+                raise ValueError("register %s has %d lanes, expected %d" % (register, len(starts[index]), lanes))
+        if lanes is None:
+            raise ValueError("no registers given and no number of lanes")
+
+        count = len(MemoryAddressTable.memory_addresses)
+        self.values = np.zeros((count, lanes))
+        self.floats = np.zeros((count, lanes), dtype=bool)  # lanes holding a float, per register
+        for (index, values) in starts.items():
+            self.values[index] = values
+            if values.dtype.kind == "O":
+                # a mix of python ints and floats
+                self.floats[index] = [isinstance(value, float) for value in values.tolist()]
+            else:
+                self.floats[index] = values.dtype.kind == "f"
+        self.state = np.zeros(lanes, dtype=np.int64)  # comparison state
+        self.ip = np.zeros(lanes, dtype=np.int64)  # instruction pointers, total_ins once a lane ended
+        self.calls = np.zeros((LaneEngine.CALL_DEPTH, lanes), dtype=np.int64)  # call stack, one column per lane
+        self.depth = np.zeros(lanes, dtype=np.int64)  # calls in progress
+        self.exit_codes = np.zeros(lanes, dtype=np.int64)
+        self.__writes = []  # (lanes, texts) of every putc and log, in the order they ran
+        self.__errors = {}
+        self.__rerun = np.zeros(lanes, dtype=bool)  # lanes left to a PVM
+        self.__leave((~self.floats & (np.abs(self.values) > LaneEngine.EXACT)).any(axis=0))
+
+        with np.errstate(all="ignore"):
+            while lanes:
+                address = int(self.ip.min())
+                if address >= self.total_ins:
+                    break
+                opcode, args = self.__instructions[address]
+                operation = self.__operations.get(opcode)
+                mask = self.ip == address
+                if operation is None:
+                    self.__leave(mask)
+                    continue
+                operation(opcode, args, mask, address)
+
+        outputs = self.__gather_outputs(lanes)
+        for lane in np.flatnonzero(self.__rerun).tolist():
+            self.__run_alone(lane, starts, outputs)
+        return LaneResult(self.exit_codes, outputs, self.__errors)
+
+    # a lane PVM runs from its start registers in place of the engine
+    def __run_alone(self, lane, starts, outputs):
+        registers = tuple(starts[index][lane:lane + 1].tolist()[0] if index in starts else 0
+                          for index in range(len(self.values)))
+        sink = BytesSink()
+        vm = VMSnapshot(self.program, registers, FMT.CMP_NONE, 0).fork(OutputChannel(sink, policy=FlushPolicy.EXIT))
+        try:
+            self.exit_codes[lane] = vm.run()
+        except PlasRuntimeError as error:
+            self.exit_codes[lane] = error.exit_code
+            self.__errors[lane] = error
+        outputs[lane] = sink.getvalue().decode("utf-8")
+
+    # the writes sorted by lane keeping their order, then joined per lane
+    def __gather_outputs(self, lanes) -> list:
+        np = self.np
+        outputs = [""] * lanes
+        if not self.__writes:
+            return outputs
+        writers = np.concatenate([written for (written, _) in self.__writes])
+        texts = [text for (_, written) in self.__writes for text in written]
+        order = np.argsort(writers, kind="stable")
+        texts = [texts[index] for index in order.tolist()]
+        writers, starts = np.unique(writers[order], return_index=True)
+        ends = starts[1:].tolist() + [len(texts)]
+        for (lane, start, end) in zip(writers.tolist(), starts.tolist(), ends):
+            outputs[lane] = "".join(texts[start:end])
+        return outputs
+
+    def __leave(self, mask):
+        self.__rerun |= mask
+        self.ip[mask] = self.total_ins
+
+    def __leave_inexact(self, values, floats, mask):
+        # a cheap look at the extremes first, most stores stay small
+        if values.max() > LaneEngine.EXACT or values.min() < -LaneEngine.EXACT:
+            self.__leave(mask & ~floats & (self.np.abs(values) > LaneEngine.EXACT))
+
+    def __operand(self, operand):
+        """ (values, float lanes) of a register or a constant """
+        if operand[0] == TokenType.TKN_MEM:
+            return self.values[operand[1]], self.floats[operand[1]]
+        return float(operand[1]), isinstance(operand[1], float)
+
+    def __store(self, register, values, floats, mask):
+        np = self.np
+        np.copyto(self.values[register], values, where=mask)
+        np.copyto(self.floats[register], floats, where=mask)
+        self.__leave_inexact(self.values[register], self.floats[register], mask)
+
+    def __write(self, mask, texts):
+        self.__writes.append((self.np.flatnonzero(mask), texts))
+
+    def __ins_putc(self, opcode, args, mask, address):
+        values = self.values[args[0][1]]
+        invalid = mask & ~((values >= 0) & (values < 0x110000))
+        self.__leave(invalid)
+        mask = mask & ~invalid
+        self.__write(mask, list(map(chr, values[mask].astype(self.np.int64).tolist())))
+        self.ip += mask
+
+    def __ins_log(self, opcode, args, mask, address):
+        register = args[0][1]
+        floats = self.floats[register][mask]
+        if floats.any():
+            values = self.values[register][mask].tolist()
+            texts = ["%s\n" % (value if real else int(value)) for (value, real) in zip(values, floats.tolist())]
+        else:
+            texts = list(map("{}\n".format, self.values[register][mask].astype(self.np.int64).tolist()))
+        self.__write(mask, texts)
+        self.ip += mask
+
+    def __ins_load(self, opcode, args, mask, address):
+        values, floats = self.__operand(args[1])
+        self.__store(args[0][1], values, floats, mask)
+        self.ip += mask
+
+    def __ins_load_const(self, opcode, args, mask, address):
+        register, value, next_address = args
+        self.__store(register, float(value), isinstance(value, float), mask)
+        self.ip[mask] = next_address
+
+    def __ins_arithmetic(self, opcode, args, mask, address):
+        values1, floats1 = self.__operand(args[0])
+        values2, floats2 = self.__operand(args[1])
+        if opcode == INSTRUCTION_ID.ADD:
+            values = values1 + values2
+        elif opcode == INSTRUCTION_ID.SUB:
+            values = values1 - values2
+        else:
+            values = values1 * values2
+        self.__store(args[0][1], values, floats1 | floats2, mask)
+        self.ip += mask
+
+    def __ins_division(self, opcode, args, mask, address):
+        np = self.np
+        values1, floats1 = self.__operand(args[0])
+        values2, _ = self.__operand(args[1])
+        zero = mask & (values2 == 0)
+        if zero.any():
+            for lane in np.flatnonzero(zero).tolist():
+                self.__errors[lane] = PlasZeroDivisionError(self.program.memory.i_line(address))
+            self.exit_codes[zero] = SysExit.EXIT_ZERO_DIVISION_ERROR
+            self.ip[zero] = self.total_ins
+            mask = mask & ~zero
+        values = values1 / values2
+        if opcode == INSTRUCTION_ID.IDIV:
+            self.__leave(mask & ~np.isfinite(values))
+            mask = mask & np.isfinite(values)
+            self.__store(args[0][1], np.trunc(values), False, mask)
+        else:
+            self.__store(args[0][1], values, True, mask)
+        self.ip += mask
+
+    def __ins_eval(self, opcode, args, mask, address):
+        self.__compare(args[0], args[1], mask)
+        self.ip += mask
+
+    def __ins_eval_branch(self, opcode, args, mask, address):
+        op1, op2, flags, target, next_address = args
+        self.__compare(op1, op2, mask)
+        self.np.copyto(self.ip, self.np.where((self.state & flags) != 0, target, next_address), where=mask)
+
+    def __compare(self, op1, op2, mask):
+        np = self.np
+        values1, _ = self.__operand(op1)
+        values2, _ = self.__operand(op2)
+        state = np.where(values1 > values2, FMT.CMP_GT, np.where(values1 == values2, FMT.CMP_EQ, FMT.CMP_LT))
+        np.copyto(self.state, state, where=mask)
+
+    def __ins_branch(self, opcode, args, mask, address):
+        taken = (self.state & OpcodeTable.BRANCH_MASKS[opcode]) != 0
+        self.np.copyto(self.ip, self.np.where(taken, args[0][1], address + 1), where=mask)
+
+    def __ins_go(self, opcode, args, mask, address):
+        self.__leave(mask & (self.depth == LaneEngine.CALL_DEPTH))
+        lanes = self.np.flatnonzero(mask & (self.depth < LaneEngine.CALL_DEPTH))
+        self.calls[self.depth[lanes], lanes] = address
+        self.depth[lanes] += 1
+        self.ip[lanes] = args[0][1]
+
+    def __ins_jump(self, opcode, args, mask, address):
+        self.ip[mask] = args[0][1]
+
+    def __ins_home(self, opcode, args, mask, address):
+        # the PVM reports a home without a call
+        self.__leave(mask & (self.depth == 0))
+        lanes = self.np.flatnonzero(mask & (self.depth > 0))
+        self.depth[lanes] -= 1
+        self.ip[lanes] = self.calls[self.depth[lanes], lanes] + 1
+
+    def __ins_exit(self, opcode, args, mask, address):
+        np = self.np
+        values, _ = self.__operand(args[0])
+        values = np.broadcast_to(values, self.ip.shape)
+        invalid = mask & ~(np.abs(values) < 2 ** 63)
+        self.__leave(invalid)
+        mask = mask & ~invalid
+        self.exit_codes[mask] = np.trunc(values[mask]).astype(np.int64)
+        self.ip[mask] = self.total_ins
+
+
+# command line runner, terminates the process with the program exit code
 class Plas:
     def __init__(self, file):
         ss = SourceStream(file)
-        if ss.get_stream() == "":
+        if ss.is_empty():
             return
 
-        preprocessor = Preprocessor(ss.get_stream())
-        tokenizer = Tokenizer(preprocessor.get_preprocessed())
-        tokenizer.to_file(file+".tkn")
-        parser = Parser(tokenizer.get_tokens())
-        PVM(raw_instruction=parser.get_raw_instructions())
+        stats = PipelineStats(file, RuntimeConfiguration.STATS_MEMORY) if RuntimeConfiguration.STATS else None
+        try:
+            program = Program.from_file(
+                file,
+                cache=CompileConfiguration.CACHE,
+                cache_dir=CompileConfiguration.CACHE_DIR,
+                token_out=CompileConfiguration.TOKEN_OUT,
+                stats=stats
+            )
+            if CompileConfiguration.OPTIMIZE:
+                with PipelineStats.measure(stats, "optimize") as record:
+                    report = program.optimize(CompileConfiguration.OPTIMIZE)
+                    record["instructions"] = len(program)
+                if CompileConfiguration.OPTIMIZE_REPORT:
+                    Plas.report_optimizer(report)
+            data = Plas.data_segment()
+            output = OutputChannel(
+                FileSink(RuntimeConfiguration.OUTPUT_FILE) if RuntimeConfiguration.OUTPUT_FILE else None,
+                RuntimeConfiguration.BUFFER_SIZE,
+                RuntimeConfiguration.FLUSH_POLICY
+            )
+            profile = Profile(program) if RuntimeConfiguration.PROFILE else None
+            trace = ExecutionTrace(program, RuntimeConfiguration.TRACE) if RuntimeConfiguration.TRACE else None
+            try:
+                exit_code = program.execute(output, RuntimeConfiguration.JIT, profile, trace, stats, data)
+            except BaseException:
+                if trace is not None:
+                    sys.stderr.write(trace.dump())
+                raise
+            finally:
+                output.close()
+                if data is not None:
+                    data.close()
+                if profile is not None:
+                    Plas.report_profile(profile, RuntimeConfiguration.PROFILE_FILE or file + ".profile.json")
+            # a program exiting with a failure status is dumped as well
+            if trace is not None and exit_code != SysExit.EXIT_SUCCESS:
+                sys.stderr.write(trace.dump())
+        except PlasError as error:
+            error.log()
+            sys.exit(error.exit_code)
+        finally:
+            if stats is not None:
+                Plas.report_stats(stats, RuntimeConfiguration.STATS)
+
+        sys.exit(exit_code)
+
+    # None lets the program size its own data memory
+    @staticmethod
+    def data_segment():
+        if RuntimeConfiguration.DATA_FILE is not None:
+            try:
+                return DataSegment.map(RuntimeConfiguration.DATA_FILE, not RuntimeConfiguration.DATA_READONLY)
+            except (OSError, ValueError) as error:
+                Log.e("error", "unable to map data file %s" % RuntimeConfiguration.DATA_FILE)
+                Log.w(str(error))
+                sys.exit(2)
+        if RuntimeConfiguration.DATA_SIZE is not None:
+            return DataSegment(RuntimeConfiguration.DATA_SIZE)
+        return None
+
+    # the report goes to stderr so the program output stays untouched
+    @staticmethod
+    def report_optimizer(report):
+        sys.stderr.write("optimizer: %s\n" % ", ".join("%s %d" % item for item in report.items()))
+
+    @staticmethod
+    def report_stats(stats, form):
+        sys.stderr.write(stats.to_json() + "\n" if form == "json" else stats.to_text())
+
+    @staticmethod
+    def report_profile(profile, file):
+        sys.stderr.write(profile.hot_spots())
+        profile.write_json(file)
+        sys.stderr.write("\nprofile written to %s\n" % file)
 
 
 class CompileConfiguration:
-    TOKEN_OUT = False
+    TOKEN_OUT = False  # dump tokens to <file>.tkn
     PARSE_OUT = False
+    CACHE = True  # reuse compiled .plasc programs
+    CACHE_DIR = None  # None stores the .plasc next to the source
+    OPTIMIZE = 0  # optimizer level, 0 runs the program as parsed
+    OPTIMIZE_REPORT = False  # print what the optimizer did to stderr
+
+
+class RuntimeConfiguration:
+    BUFFER_SIZE = OutputChannel.DEFAULT_BUFFER_SIZE  # pending output characters
+    FLUSH_POLICY = FlushPolicy.BLOCK  # line, block or exit
+    OUTPUT_FILE = None  # None writes putc and log output to stdout
+    JIT = False  # compile hot loops to python
+    PROFILE = False  # count and time every instruction, turns the jit off
+    PROFILE_FILE = None  # None writes the json profile to <file>.profile.json
+    TRACE = 0  # instructions kept for the failure trace, 0 keeps none
+    STATS = None  # text or json phase stats on stderr, None reports nothing
+    STATS_MEMORY = False  # trace the peak memory of each phase with tracemalloc
+    DATA_SIZE = None  # data memory bytes, None sizes it from the program
+    DATA_FILE = None  # file mapped as data memory instead
+    DATA_READONLY = False  # map the data file read only
+
+
+def run_batch(args):
+    files = BatchRunner.expand(args.batch)
+    if not files:
+        Log.w("no programs match %s" % " ".join(args.batch))
+        sys.exit(2)
+
+    start = time.perf_counter()
+    runner = BatchRunner(files, args.jobs, args.timeout, not args.no_cache, args.cache_dir, args.optimize)
+    records = runner.run()
+    summary = BatchRunner.summary(records, time.perf_counter() - start)
+    for record in records:
+        Log.w("%-14s %4s  %s" % (record["status"], "" if record["exit_code"] is None else record["exit_code"],
+                                 record["file"]))
+    Log.w("%d programs in %.3fs on %d workers" % (summary["programs"], summary["wall_seconds"], runner.jobs))
+    if args.report:
+        BatchRunner.write_report(records, summary, args.report)
+
+
+def emit_python(file, module):
+    try:
+        program = Program.from_file(file, cache=CompileConfiguration.CACHE, cache_dir=CompileConfiguration.CACHE_DIR)
+    except PlasError as error:
+        error.log()
+        sys.exit(error.exit_code)
+    if CompileConfiguration.OPTIMIZE:
+        report = program.optimize(CompileConfiguration.OPTIMIZE)
+        if CompileConfiguration.OPTIMIZE_REPORT:
+            Plas.report_optimizer(report)
+    with open(module, "w") as f:
+        f.write(PythonEmitter(program).emit())
 
 
 def main():
-    if len(sys.argv) <= 1:
+    arg_parser = argparse.ArgumentParser(prog="plas", description="Pretend Like Assembly interpreter")
+    arg_parser.add_argument("file", nargs="?", help="plas source file")
+    arg_parser.add_argument("--tokens", action="store_true", help="write the tokens to <file>.tkn")
+    arg_parser.add_argument("-O", "-O1", dest="optimize", action="store_const", const=1, default=0,
+                            help="fuse common instruction sequences before running")
+    arg_parser.add_argument("-O2", dest="optimize", action="store_const", const=2,
+                            help="-O plus constant propagation, dead code removal and load hoisting")
+    arg_parser.add_argument("--opt-report", action="store_true", help="print the optimizer report to stderr")
+    arg_parser.add_argument("--jit", action="store_true", help="compile hot loops to python while running")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print the hottest labels and lines to stderr and write a json profile")
+    arg_parser.add_argument("--profile-json", metavar="FILE", help="json profile file (default: <file>.profile.json)")
+    arg_parser.add_argument("--trace", type=int, default=0, metavar="N",
+                            help="keep the last N instructions run and print them to stderr when the program fails")
+    arg_parser.add_argument("--stats", action="store_true", help="print the time and counts of every phase to stderr")
+    arg_parser.add_argument("--stats-format", choices=("text", "json"),
+                            help="format of --stats, implies it (default: text)")
+    arg_parser.add_argument("--stats-memory", action="store_true",
+                            help="add the peak memory of every phase to --stats, slows the run down")
+    arg_parser.add_argument("--data-size", type=int, metavar="BYTES",
+                            help="bytes of data memory (default: %d for programs using it)" % DataSegment.DEFAULT_SIZE)
+    arg_parser.add_argument("--data-file", metavar="FILE", help="map FILE as data memory, stores write to it")
+    arg_parser.add_argument("--data-readonly", action="store_true", help="map --data-file read only")
+    arg_parser.add_argument("--emit-py", metavar="FILE", help="write the program as a standalone python module")
+    arg_parser.add_argument("--no-cache", action="store_true", help="always compile from source")
+    arg_parser.add_argument("--cache-dir", metavar="DIR", help="directory for compiled .plasc programs")
+    arg_parser.add_argument("--output", metavar="FILE", help="write program output to FILE instead of stdout")
+    arg_parser.add_argument("--flush", choices=FlushPolicy.policies, default=FlushPolicy.BLOCK,
+                            help="output flush policy (default: block)")
+    arg_parser.add_argument("--buffer-size", type=int, default=OutputChannel.DEFAULT_BUFFER_SIZE, metavar="N",
+                            help="characters buffered before a block flush")
+    arg_parser.add_argument("--batch", action="append", metavar="PATTERN",
+                            help="run every program matching a directory or glob, may be repeated")
+    arg_parser.add_argument("--jobs", type=int, metavar="N", help="batch worker processes (default: cpu count)")
+    arg_parser.add_argument("--timeout", type=float, metavar="SECONDS", help="per program batch timeout")
+    arg_parser.add_argument("--report", metavar="FILE", help="batch report file, .json or .csv")
+    args = arg_parser.parse_args()
+    if args.trace < 0:
+        arg_parser.error("--trace needs a positive number of instructions")
+    if args.trace and (args.profile or args.profile_json is not None):
+        arg_parser.error("--trace cannot be combined with --profile")
+    if args.data_size is not None and args.data_size < 0:
+        arg_parser.error("--data-size needs a positive number of bytes")
+    if args.data_size is not None and args.data_file is not None:
+        arg_parser.error("--data-size cannot be combined with --data-file")
+    if args.data_readonly and args.data_file is None:
+        arg_parser.error("--data-readonly needs --data-file")
+
+    if args.batch:
+        run_batch(args)
+        return
+
+    if args.file is None:
         Log.e("error", "unable to start process without a file")
         Log.w("source file is needed")
         sys.exit(1)
 
-    source_file = sys.argv[1]
+    source_file = args.file
     if not os.path.exists(source_file):
         Log.w("file not found %s" % source_file)
         sys.exit(2)
 
+    CompileConfiguration.TOKEN_OUT = args.tokens
+    CompileConfiguration.CACHE = not args.no_cache
+    CompileConfiguration.OPTIMIZE = args.optimize
+    CompileConfiguration.OPTIMIZE_REPORT = args.opt_report
+    CompileConfiguration.CACHE_DIR = args.cache_dir
+    RuntimeConfiguration.OUTPUT_FILE = args.output
+    RuntimeConfiguration.FLUSH_POLICY = args.flush
+    RuntimeConfiguration.BUFFER_SIZE = args.buffer_size
+    RuntimeConfiguration.JIT = args.jit
+    RuntimeConfiguration.PROFILE = args.profile or args.profile_json is not None
+    RuntimeConfiguration.PROFILE_FILE = args.profile_json
+    RuntimeConfiguration.TRACE = args.trace
+    if args.stats or args.stats_format or args.stats_memory:
+        RuntimeConfiguration.STATS = args.stats_format or "text"
+    RuntimeConfiguration.STATS_MEMORY = args.stats_memory
+    RuntimeConfiguration.DATA_SIZE = args.data_size
+    RuntimeConfiguration.DATA_FILE = args.data_file
+    RuntimeConfiguration.DATA_READONLY = args.data_readonly
+    if args.emit_py:
+        emit_python(source_file, args.emit_py)
+        return
     Plas(source_file)
 
 
@@ -0,0 +1,29 @@
+import pytest
+
+from plas import Program
+from plas import PythonEmitter
+
+
+def emitted(source, level=0):
+    program = Program.from_source(source)
+    if level:
+        program.optimize(level)
+    namespace = {"__name__": "emitted"}
+    exec(compile(PythonEmitter(program).emit(), "<emitted>", "exec"), namespace)
+    return namespace["run"]
+
+
+@pytest.mark.parametrize("level", [0, 2])
+def test_self_jump_compiles(level):
+    # runs forever like the interpreter does, it only has to compile
+    assert callable(emitted("load $0 1\ngo @a : a\n", level))
+
+
+@pytest.mark.parametrize("source, level", [
+    ("# nothing but a comment\n", 0),
+    ("load $0 1\nadd $0 2\n", 2)  # both are dead stores at -O2
+])
+def test_program_without_instructions(source, level):
+    output = []
+    assert emitted(source, level)(output.append) == 0
+    assert output == []
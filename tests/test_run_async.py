@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from plas import PVM
+from plas import Program
+from lang.output import OutputChannel
+from lang.output import BytesSink
+from lang.output import AsyncQueueSink
+
+# a loop without an end, the jit compiles it into a single closed trace
+ENDLESS = "load $0 0\nadd $0 1 : top\ngo @top\n"
+# logs 0 to 99
+COUNT = "load $0 0\nlog $0 : top\nadd $0 1\neval $0 100\niflt @top\n"
+
+
+@pytest.mark.parametrize("jit", [False, True])
+def test_run_async_times_out(jit):
+    vm = PVM(Program.from_source(ENDLESS), OutputChannel(BytesSink()), jit)
+
+    async def run():
+        await asyncio.wait_for(vm.run_async(100), 0.2)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert not vm.finished()
+
+
+def test_step_bounds_jit_loops():
+    vm = PVM(Program.from_source(ENDLESS), OutputChannel(BytesSink()), True)
+    for _ in range(100):
+        vm.step(10)
+    # ten dispatches and ten passes of a compiled loop per step at most
+    assert vm.registers()["$0"] <= 100 * 20
+
+
+def test_run_async_streams_to_async_sinks():
+    queue = asyncio.Queue()
+    # the default block policy would hold all of the output until the end
+    vm = PVM(Program.from_source(COUNT), OutputChannel(AsyncQueueSink(queue)))
+
+    async def run():
+        task = asyncio.ensure_future(vm.run_async(10))
+        first = await queue.get()
+        finished = vm.finished()
+        chunks = [first]
+        await task
+        while not queue.empty():
+            chunks.append(queue.get_nowait())
+        return finished, chunks
+
+    finished, chunks = asyncio.run(run())
+    assert not finished
+    assert "".join(chunks) == "".join("%d\n" % i for i in range(100))